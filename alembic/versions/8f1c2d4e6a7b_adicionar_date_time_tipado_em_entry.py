@@ -0,0 +1,67 @@
+"""Adicionar coluna date_time tipada e índice (employee_id, date_time) em entry
+
+Revision ID: 8f1c2d4e6a7b
+Revises: 322ce3a39f54
+Create Date: 2026-10-18 10:12:41.508233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.entry import parse_entry_date
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f1c2d4e6a7b'
+down_revision: Union[str, None] = '322ce3a39f54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('entry', sa.Column('date_time', sa.DateTime(), nullable=True))
+
+    # Preencher a nova coluna a partir das datas string existentes, em
+    # páginas por id para não carregar a tabela inteira na memória
+    bind = op.get_bind()
+    entry = sa.table(
+        'entry',
+        sa.column('id', sa.Integer),
+        sa.column('date', sa.String),
+        sa.column('date_time', sa.DateTime),
+    )
+    stmt = (
+        entry.update()
+        .where(entry.c.id == sa.bindparam('entry_id'))
+        .values(date_time=sa.bindparam('date_time'))
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(entry.c.id, entry.c.date)
+            .where(entry.c.id > last_id)
+            .order_by(entry.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(stmt, [
+            {'entry_id': row.id, 'date_time': parse_entry_date(row.date)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.create_index('ix_entry_date_time', 'entry', ['date_time'])
+    op.create_index('ix_entry_employee_id_date_time', 'entry', ['employee_id', 'date_time'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_entry_employee_id_date_time', table_name='entry')
+    op.drop_index('ix_entry_date_time', table_name='entry')
+    op.drop_column('entry', 'date_time')
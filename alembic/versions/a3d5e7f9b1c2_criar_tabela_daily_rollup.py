@@ -0,0 +1,57 @@
+"""Criar tabela daily_rollup com totais por funcionário/dia/refinaria
+
+Revision ID: a3d5e7f9b1c2
+Revises: 8f1c2d4e6a7b
+Create Date: 2026-10-18 11:40:03.114927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d5e7f9b1c2'
+down_revision: Union[str, None] = '8f1c2d4e6a7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # O env.py importa o app, cujo db.create_all() já pode ter criado a tabela (vazia)
+    if not inspector.has_table('daily_rollup'):
+        op.create_table(
+            'daily_rollup',
+            sa.Column('employee_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('refinery', sa.String(length=100), nullable=False),
+            sa.Column('points', sa.BigInteger(), nullable=False),
+            sa.Column('entries', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['employee_id'], ['employee.id']),
+            sa.PrimaryKeyConstraint('employee_id', 'day', 'refinery')
+        )
+    if 'ix_daily_rollup_day' not in {index['name'] for index in inspector.get_indexes('daily_rollup')}:
+        op.create_index('ix_daily_rollup_day', 'daily_rollup', ['day'])
+
+    # Backfill a partir dos registros existentes (sempre que a tabela estiver vazia)
+    if bind.execute(sa.text('SELECT COUNT(*) FROM daily_rollup')).scalar() == 0:
+        op.execute(
+            """
+            INSERT INTO daily_rollup (employee_id, day, refinery, points, entries)
+            SELECT employee_id, date(date_time), refinery, SUM(points), COUNT(id)
+            FROM entry
+            WHERE date_time IS NOT NULL
+            GROUP BY employee_id, date(date_time), refinery
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_daily_rollup_day', table_name='daily_rollup')
+    op.drop_table('daily_rollup')
@@ -4,8 +4,12 @@ from flask_caching import Cache
 from flask_mail import Mail
 from models import db
 from utils.helpers import safe_json_dumps
+from utils.result_cache import result_cache
+from utils.cache_backends import ensure_private_directory
+from utils.excel_ingest import sheet_reader
 import time
 import os
+import click
 
 # Instanciar cache antes das rotas
 cache = Cache()
@@ -15,18 +19,24 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 # Config padrão de cache
-app.config.setdefault('CACHE_TYPE', 'simple')
+app.config.setdefault('CACHE_TYPE', 'FileSystemCache')
 app.config.setdefault('CACHE_DEFAULT_TIMEOUT', 30)
 
+# Cache em disco do Flask-Caching (pickle): só em diretório privado
+if app.config['CACHE_TYPE'] == 'FileSystemCache':
+    ensure_private_directory(app.config['CACHE_DIR'])
+
 # Inicializar extensões
 cache.init_app(app)
+result_cache.init_app(app)
+sheet_reader.init_app(app)
 mail = Mail(app)
 db.init_app(app)
 
 # Importar blueprints após cache existir
 from routes.auth import auth_bp
 from routes.dashboard import dashboard_bp
-from routes.api import api_bp
+from routes.api import api_bp, critical_refresher
 from routes.diagnostics import diagnostics_bp
 from routes.excel_dashboard_simple import excel_dashboard_simple_bp
 
@@ -37,6 +47,9 @@ app.register_blueprint(api_bp)
 app.register_blueprint(diagnostics_bp)
 app.register_blueprint(excel_dashboard_simple_bp)
 
+# Atualização em segundo plano dos dados críticos (opt-in)
+critical_refresher.init_app(app)
+
 # Adicionar função auxiliar ao contexto do template
 app.jinja_env.globals.update(safe_json_dumps=safe_json_dumps)
 
@@ -48,9 +61,45 @@ with app.app_context():
     except Exception as e:
         app.logger.error(f"Erro ao criar tabelas: {str(e)}")
 
+# daily_rollup vazia com registros em Entry: todas as agregações leriam 0
+with app.app_context():
+    try:
+        from utils.rollup import ensure_daily_rollup
+        rebuilt = ensure_daily_rollup()
+        if rebuilt is not None:
+            app.logger.warning(f"⚠️ daily_rollup estava vazia com registros em Entry: recalculada ({rebuilt} linhas)")
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"❌ daily_rollup vazia e não foi possível recalcular (rode 'flask rebuild-rollup'): {str(e)}")
+
 # Tornar cache acessível via current_app.cache
 app.cache = cache
 
+@app.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Recalcula a tabela daily_rollup a partir de todos os registros"""
+    from utils.rollup import rebuild_daily_rollup
+    rows = rebuild_daily_rollup()
+    print(f"✅ daily_rollup recalculada: {rows} linhas")
+
+@app.cli.command('import-excel')
+@click.argument('folder_path', default='registros monitorar')
+@click.option('--dry-run', is_flag=True, help='Mostra o que seria importado sem gravar')
+def import_excel_command(folder_path, dry_run):
+    """Importa para o banco os registros das planilhas Excel da pasta"""
+    from routes.excel_dashboard_simple import import_folder
+    if not os.path.exists(folder_path):
+        print(f"❌ Pasta \"{folder_path}\" não encontrada")
+        return
+    result = import_folder(folder_path, dry_run=dry_run)
+    action = 'seriam importados' if dry_run else 'importados'
+    print(f"✅ {result['inserted']} registros {action} de {result['files']} arquivos "
+          f"({result['duplicates']} já existentes, {result['without_date']} sem data)")
+    for file_name, message in result['errors'].items():
+        print(f"⚠️ {file_name}: {message}")
+    if result['unknown_employees']:
+        print(f"⚠️ Funcionários não encontrados: {', '.join(result['unknown_employees'])}")
+
 @app.before_request
 def start_timer():
     request.start_time = time.time()
@@ -4,6 +4,10 @@ from dotenv import load_dotenv
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Caches em disco (desserializados com pickle) ficam na pasta instance/ do app,
+# criada com permissão 0o700, e não no diretório temporário compartilhado
+INSTANCE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance')
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
     
@@ -33,6 +37,46 @@ class Config:
     # Timezone
     TIMEZONE = 'America/Sao_Paulo'
     
+    # ================= Cache de resultados =================
+    # As escritas invalidam por geração, então o TTL pode ser longo
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 6 * 60 * 60))
+    # 'sqlite' = arquivo compartilhado por todos os workers do gunicorn; 'memory' = por processo
+    RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'sqlite')
+    RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', os.path.join(INSTANCE_DIR, 'result_cache', 'result_cache.sqlite3'))
+    # Limites do cache (LRU): número de entradas e tamanho aproximado em bytes
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 1024))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Single-flight: espera máxima pelo recálculo de outro worker e janela para servir valor obsoleto (0 = desabilitado)
+    RESULT_CACHE_LOCK_TIMEOUT = int(os.getenv('RESULT_CACHE_LOCK_TIMEOUT', 30))
+    RESULT_CACHE_STALE_TTL = int(os.getenv('RESULT_CACHE_STALE_TTL', 0))
+    
+    # Atualização dos dados críticos em segundo plano (fora do caminho da requisição)
+    CRITICAL_REFRESH_ENABLED = os.getenv('CRITICAL_REFRESH_ENABLED', 'False').lower() == 'true'
+    CRITICAL_REFRESH_INTERVAL = int(os.getenv('CRITICAL_REFRESH_INTERVAL', 5 * 60))
+    CRITICAL_REFRESH_POLL = int(os.getenv('CRITICAL_REFRESH_POLL', 2))
+    
+    # Exportação: processos usados para gerar as planilhas em paralelo (0 ou 1 = sem pool)
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 0))
+    # Reaproveitar no result_cache as planilhas de funcionários sem registros alterados
+    EXPORT_CACHE_ENABLED = os.getenv('EXPORT_CACHE_ENABLED', 'True').lower() == 'true'
+    
+    # Carga de pastas de Excel: processos usados para ler os arquivos em paralelo (0 ou 1 = sem pool)
+    EXCEL_LOAD_WORKERS = int(os.getenv('EXCEL_LOAD_WORKERS', 0))
+    # Cache em disco das planilhas já lidas (validado por tamanho, mtime e hash; vazio = desabilitado)
+    EXCEL_PARSE_CACHE_DIR = os.getenv('EXCEL_PARSE_CACHE_DIR', os.path.join(INSTANCE_DIR, 'excel_cache'))
+    
+    # Planilhas a partir deste tamanho são lidas em streaming, em blocos de EXCEL_CHUNK_ROWS linhas
+    EXCEL_STREAM_MIN_BYTES = int(os.getenv('EXCEL_STREAM_MIN_BYTES', 1024 * 1024))
+    EXCEL_CHUNK_ROWS = int(os.getenv('EXCEL_CHUNK_ROWS', 10000))
+    # Campos que identificam um registro duplicado ao mesclar planilhas (date, points, refinery, month)
+    EXCEL_DEDUP_KEY = os.getenv('EXCEL_DEDUP_KEY', 'date,points')
+    # Importação das planilhas para o banco: registros por lote de INSERT (executemany)
+    EXCEL_IMPORT_BATCH_SIZE = int(os.getenv('EXCEL_IMPORT_BATCH_SIZE', 1000))
+    
+    # Flask-Caching em disco para ser compartilhado entre workers
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'FileSystemCache')
+    CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(INSTANCE_DIR, 'flask_cache'))
+    
     # ================= Configurações de Email =================
     MAIL_SERVER = os.getenv('MAIL_SERVER')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -1,5 +1,6 @@
 from app import app, db, Entry, Employee
 from datetime import datetime
+from utils.rollup import rebuild_daily_rollup
 
 with app.app_context():
     # Busca o ID do Maurício de forma segura
@@ -31,4 +32,8 @@ with app.app_context():
             db.session.add(new_entry)
         
         db.session.commit()
-        print(f"✅ {len(registros)} registros do Maurício inseridos com sucesso!")
\ No newline at end of file
+        print(f"✅ {len(registros)} registros do Maurício inseridos com sucesso!")
+
+        # Backfill direto em Entry: recalcular os totais diários
+        rows = rebuild_daily_rollup()
+        print(f"✅ daily_rollup recalculada: {rows} linhas")
\ No newline at end of file
@@ -20,9 +20,10 @@ def init_db(app):
 
 # Importar modelos após definir db
 from .employee import Employee
-from .entry import Entry
+from .entry import Entry, parse_entry_date
+from .daily_rollup import DailyRollup
 
 # Exportar para facilitar importação
-__all__ = ['db', 'Employee', 'Entry', 'init_db']
+__all__ = ['db', 'Employee', 'Entry', 'DailyRollup', 'parse_entry_date', 'init_db']
 
 # Substituir as ocorrências de app.logger por current_app.logger
\ No newline at end of file
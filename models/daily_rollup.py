@@ -0,0 +1,24 @@
+from . import db
+
+
+class DailyRollup(db.Model):
+    """Totais de pontos por funcionário, dia e refinaria.
+
+    Mantida de forma incremental na mesma transação das escritas em Entry
+    (ver utils/rollup.py), para que as leituras semanais/mensais somem no
+    máximo ~31 linhas por funcionário em vez de varrer o histórico.
+    """
+    __tablename__ = 'daily_rollup'
+
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    refinery = db.Column(db.String(100), primary_key=True)
+    points = db.Column(db.BigInteger, nullable=False, default=0)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_daily_rollup_day', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<DailyRollup {self.employee_id} - {self.day} - {self.refinery} - {self.points}>'
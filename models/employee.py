@@ -8,7 +8,9 @@ class Employee(db.Model):
     role = db.Column(db.String(50), default='Funcionário')  # Voltando ao nome original
     access_key = db.Column(db.String(50), nullable=False)
     default_refinery = db.Column(db.String(100))
-    entries = db.relationship('Entry', backref='employee', lazy=True)
+    # Carregamento explícito: leituras em massa usam projeções (entry_rows_query)
+    # e só quem precisa dos objetos carrega a relação
+    entries = db.relationship('Entry', backref=db.backref('employee', lazy='select'), lazy='select')
     
     @property
     def weekly_goal(self):
@@ -1,14 +1,45 @@
 from . import db
 from datetime import datetime
+from sqlalchemy.orm import validates
 import pytz
 
+
+def parse_entry_date(value):
+    """Converte a data string do registro ('YYYY-MM-DD' ou 'YYYY-MM-DD HH:MM[:SS]') para datetime"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            return datetime.strptime(text[:10], '%Y-%m-%d')
+        except ValueError:
+            return None
+
+
 class Entry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     date = db.Column(db.String(20), nullable=False)
+    # Versão tipada de `date`, mantida em sincronia pelo validador abaixo.
+    # Os filtros de intervalo usam esta coluna para aproveitar os índices.
+    date_time = db.Column(db.DateTime, index=True)
     refinery = db.Column(db.String(100), nullable=False)
     points = db.Column(db.BigInteger, nullable=False)
     observations = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('ix_entry_employee_id_date_time', 'employee_id', 'date_time'),
+    )
+
+    @validates('date')
+    def _sync_date_time(self, key, value):
+        """Mantém `date_time` atualizado sempre que `date` for alterado"""
+        self.date_time = parse_entry_date(value)
+        return value
     
     @property
     def timestamp(self):
@@ -21,4 +52,4 @@ class Entry(db.Model):
             return datetime.now(pytz.timezone('America/Sao_Paulo'))
     
     def __repr__(self):
-        return f'<Entry {self.employee.real_name} - {self.date} - {self.points}>'
\ No newline at end of file
+        return f'<Entry {self.employee.real_name} - {self.date} - {self.points}>'
@@ -1,140 +1,100 @@
-from flask import Blueprint, request, jsonify, send_file, current_app, session, redirect, url_for, flash, render_template
+from flask import Blueprint, request, jsonify, current_app, session, redirect, url_for, flash, render_template, Response, stream_with_context
 from models import db, Employee, Entry
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
 from utils.data_processing import get_weekly_evolution_data
+from utils.aggregations import weekly_totals_by_employee
+from utils.rollup import add_entry_to_rollup, remove_entry_from_rollup, clear_rollup
+from utils.result_cache import result_cache, daily_cache_key
+from utils.snapshot_refresher import SnapshotRefresher
 from utils.email_utils import send_confirmation_email
 import tempfile
 from utils.calculations import calculate_weekly_progress, get_current_week, get_week_from_date
-import io
-import zipfile
 from calendar import monthrange
 import time
 
 api_bp = Blueprint('api', __name__)
 
-# Cache simples em memória - OTIMIZADO
-_cache = {}
-_cache_timeout = 600  # 10 minutos (aumentado)
-_cache_stats = {'hits': 0, 'misses': 0}
-
 # Pré-carregamento de dados críticos
+# O snapshot fica no cache compartilhado; esta cópia local é só o último valor bom
 _critical_data = {}
-_last_preload = 0
-_preload_interval = 300  # 5 minutos
+
+def cached_critical_data():
+    """Snapshot de dados críticos do dia, calculado uma vez entre todos os workers"""
+    return result_cache.get_or_compute(daily_cache_key('critical_data'), load_critical_data)
+
+# Atualização opcional em segundo plano (CRITICAL_REFRESH_ENABLED)
+critical_refresher = SnapshotRefresher('critical_data', cached_critical_data)
 
 def preload_critical_data():
     """Pré-carrega dados críticos para eliminar lag"""
-    global _critical_data, _last_preload
-    
-    current_time = time.time()
-    if current_time - _last_preload < _preload_interval:
-        return _critical_data
+    global _critical_data
     
     try:
-        current_app.logger.info("🔄 Pré-carregando dados críticos...")
-        
-        # Buscar todos os dados de uma vez
-        employees = Employee.query.all()
-        all_entries = Entry.query.all()
-        
-        # Processar dados críticos
-        employee_data = {}
-        weekly_data = {}
-        monthly_data = {}
-        
-        for employee in employees:
-            employee_data[employee.id] = {
-                'id': employee.id,
-                'name': employee.real_name,
-                'username': employee.username,
-                'role': employee.display_role,
-                'weekly_goal': employee.weekly_goal
-            }
-        
-        # Calcular dados semanais
-        from utils.calculations import get_week_dates
-        week_dates = []
-        for week in range(1, 6):
-            start_date, end_date = get_week_dates(str(week))
-            week_dates.append((start_date, end_date))
-        
-        # Processar todos os registros
-        for entry in all_entries:
-            entry_date = entry.date
-            if hasattr(entry_date, 'strftime'):
-                entry_date_str = entry_date.strftime('%Y-%m-%d')
-            else:
-                entry_date_str = str(entry_date)[:10]
-            
-            # Semanal
-            for week_idx, (start_date, end_date) in enumerate(week_dates):
-                if start_date <= entry_date_str <= end_date:
-                    if entry.employee_id not in weekly_data:
-                        weekly_data[entry.employee_id] = [0] * 5
-                    weekly_data[entry.employee_id][week_idx] += entry.points
-                    break
-        
-        # Calcular progresso para cada funcionário
-        for employee in employees:
-            if employee.id in weekly_data:
-                weekly_points = sum(weekly_data[employee.id])
-                weekly_goal = employee.weekly_goal
-                progress_percentage = (weekly_points / weekly_goal * 100) if weekly_goal > 0 else 0
-                remaining_points = max(0, weekly_goal - weekly_points)
-                
-                employee_data[employee.id].update({
-                    'weekly_points': weekly_points,
-                    'progress_percentage': progress_percentage,
-                    'remaining_points': remaining_points
-                })
-        
-        _critical_data = {
-            'employees': employee_data,
-            'weekly_data': weekly_data,
-            'last_update': current_time
-        }
-        
-        _last_preload = current_time
-        current_app.logger.info("✅ Dados críticos pré-carregados com sucesso")
+        # Com o refresher ativo a requisição só lê o snapshot já publicado
+        if critical_refresher.enabled:
+            critical_refresher.ensure_started()
+            if critical_refresher.snapshot is not None:
+                return critical_refresher.snapshot
         
+        _critical_data = cached_critical_data()
         return _critical_data
         
     except Exception as e:
         current_app.logger.error(f"Erro ao pré-carregar dados: {str(e)}")
         return _critical_data
 
-def get_cached_data(key):
-    """Obtém dados do cache se ainda válidos"""
-    if key in _cache:
-        data, timestamp = _cache[key]
-        if time.time() - timestamp < _cache_timeout:
-            _cache_stats['hits'] += 1
-            return data
-    _cache_stats['misses'] += 1
-    return None
-
-def set_cached_data(key, data):
-    """Armazena dados no cache"""
-    _cache[key] = (data, time.time())
+def load_critical_data():
+    """Calcula o snapshot de dados críticos (funcionários + progresso semanal)"""
+    current_app.logger.info("🔄 Pré-carregando dados críticos...")
+    
+    # Buscar funcionários; os registros são agregados direto no banco
+    employees = Employee.query.all()
+    
+    # Processar dados críticos
+    employee_data = {}
+    
+    for employee in employees:
+        employee_data[employee.id] = {
+            'id': employee.id,
+            'name': employee.real_name,
+            'username': employee.username,
+            'role': employee.display_role,
+            'weekly_goal': employee.weekly_goal
+        }
+    
+    # Calcular dados semanais (agregados no banco)
+    weekly_data = weekly_totals_by_employee()
+    
+    # Calcular progresso para cada funcionário
+    for employee in employees:
+        if employee.id in weekly_data:
+            weekly_points = sum(weekly_data[employee.id])
+            weekly_goal = employee.weekly_goal
+            progress_percentage = (weekly_points / weekly_goal * 100) if weekly_goal > 0 else 0
+            remaining_points = max(0, weekly_goal - weekly_points)
+            
+            employee_data[employee.id].update({
+                'weekly_points': weekly_points,
+                'progress_percentage': progress_percentage,
+                'remaining_points': remaining_points
+            })
+    
+    critical_data = {
+        'employees': employee_data,
+        'weekly_data': weekly_data,
+        'last_update': time.time()
+    }
+    current_app.logger.info("✅ Dados críticos pré-carregados com sucesso")
+    
+    return critical_data
 
 def clear_cache():
     """Limpa todo o cache"""
-    _cache.clear()
-    _cache_stats['hits'] = 0
-    _cache_stats['misses'] = 0
+    result_cache.clear()
 
 def get_cache_stats():
     """Retorna estatísticas do cache"""
-    total = _cache_stats['hits'] + _cache_stats['misses']
-    hit_rate = (_cache_stats['hits'] / total * 100) if total > 0 else 0
-    return {
-        'hit_rate': hit_rate,
-        'hits': _cache_stats['hits'],
-        'misses': _cache_stats['misses'],
-        'total': total
-    }
+    return result_cache.stats()
 
 @api_bp.route('/register_points', methods=['POST'])
 def register_points():
@@ -164,13 +124,11 @@ def register_points():
         )
 
         db.session.add(new_entry)
+        add_entry_to_rollup(employee_id, date_with_time, refinery, points)
         db.session.commit()
         
         # Invalidar cache relacionado a este funcionário
-        # cache.delete_memoized(get_employees_summary_cached)
-        # cache.delete_memoized(get_weekly_data_cached)
-        # cache.delete_memoized(get_monthly_data_cached)
-        # cache.delete_memoized(get_daily_data_cached)
+        result_cache.invalidate(employee_id)
         
         # Buscar informações do funcionário para o email
         employee = Employee.query.get(employee_id)
@@ -210,18 +168,19 @@ def edit_entry(entry_id):
             time_part = request.form.get('time', '').strip()
             if time_part and len(time_part)==5:  # HH:MM
                 time_part += ':00'
+            # Descontar o estado antigo do rollup antes de alterar
+            remove_entry_from_rollup(entry.employee_id, entry.date, entry.refinery, entry.points)
+            
             entry.date = f"{date_part} {time_part}" if time_part else date_part
             entry.refinery = request.form['refinery']
             entry.points = int(request.form['points'])
             entry.observations = request.form.get('observations', '')
             
+            add_entry_to_rollup(entry.employee_id, entry.date, entry.refinery, entry.points)
             db.session.commit()
             
             # Invalidar cache relacionado
-            # cache.delete_memoized(get_employees_summary_cached)
-            # cache.delete_memoized(get_weekly_data_cached)
-            # cache.delete_memoized(get_monthly_data_cached)
-            # cache.delete_memoized(get_daily_data_cached)
+            result_cache.invalidate(entry.employee_id)
             
             flash('Registro atualizado com sucesso!', 'success')
             
@@ -267,14 +226,13 @@ def delete_entry(entry_id):
         return redirect(url_for('dashboard.employee_dashboard_enhanced'))
     
     try:
+        remove_entry_from_rollup(entry.employee_id, entry.date, entry.refinery, entry.points)
+        employee_id = entry.employee_id
         db.session.delete(entry)
         db.session.commit()
         
         # Invalidar cache relacionado
-        # cache.delete_memoized(get_employees_summary_cached)
-        # cache.delete_memoized(get_weekly_data_cached)
-        # cache.delete_memoized(get_monthly_data_cached)
-        # cache.delete_memoized(get_daily_data_cached)
+        result_cache.invalidate(employee_id)
         
         flash('Registro deletado com sucesso!', 'success')
         return redirect(url_for('dashboard.employee_dashboard_enhanced'))
@@ -291,10 +249,11 @@ def delete_all_entries():
     
     try:
         Entry.query.delete()
+        clear_rollup()
         db.session.commit()
         
         # Invalidar todo o cache
-        # cache.clear()
+        result_cache.invalidate()
         
         flash('Todos os registros foram deletados!', 'success')
         return redirect(url_for('dashboard.ceo_dashboard_enhanced'))
@@ -316,75 +275,42 @@ def export():
             flash('Nenhum funcionário encontrado para exportar!', 'warning')
             return redirect(url_for('dashboard.ceo_dashboard_enhanced'))
         
-        # Criar ZIP com arquivos separados por funcionário
-        zip_buffer = io.BytesIO()
+        from utils.tabular_export import EXPORT_FORMATS, ExportFormatUnavailable, tabular_export
         
-        with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-            for employee in employees:
-                # Buscar registros do funcionário
-                entries = Entry.query.filter_by(employee_id=employee.id).order_by(Entry.date.desc()).all()
-                
-                if entries:
-                    # Criar workbook para o funcionário
-                    wb = Workbook()
-                    ws = wb.active
-                    ws.title = employee.real_name
-
-                    # Estilos
-                    header_font = Font(bold=True, color="FFFFFF")
-                    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                    
-                    # Cabeçalhos
-                    headers = ['Data', 'Refinaria', 'Pontos', 'Observações']
-                    for col, header in enumerate(headers, 1):
-                        cell = ws.cell(row=1, column=col, value=header)
-                        cell.font = header_font
-                        cell.fill = header_fill
-                        cell.alignment = Alignment(horizontal="center")
-
-                    # Dados
-                    total_points = 0
-                    for row, entry in enumerate(entries, 2):
-                        ws.cell(row=row, column=1, value=entry.date)
-                        ws.cell(row=row, column=2, value=entry.refinery)
-                        ws.cell(row=row, column=3, value=entry.points)
-                        ws.cell(row=row, column=4, value=entry.observations or '')
-                        total_points += entry.points
-                    
-                    # Linha de total
-                    remaining_monthly = max(0, employee.monthly_goal - total_points)
-                    
-                    total_row = len(entries) + 2
-                    ws.cell(row=total_row, column=1, value='Total')
-                    ws.cell(row=total_row, column=2, value='')
-                    ws.cell(row=total_row, column=3, value=total_points)
-                    ws.cell(row=total_row, column=4, value=f'Restante mensal: {remaining_monthly}')
-
-                    # Ajustar largura das colunas
-                    for column in ws.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        ws.column_dimensions[column_letter].width = adjusted_width
-                    
-                    # Salvar arquivo do funcionário no ZIP
-                    excel_buffer = io.BytesIO()
-                    wb.save(excel_buffer)
-                    excel_buffer.seek(0)
-                    zip_file.writestr(f"{employee.real_name}.xlsx", excel_buffer.read())
+        export_format = request.args.get('format', 'xlsx').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'message': f'Formato inválido. Use: {", ".join(EXPORT_FORMATS)}'}), 400
         
-        zip_buffer.seek(0)
-        return send_file(
-            zip_buffer,
-            as_attachment=True,
-            download_name='relatorios_funcionarios.zip',
-            mimetype='application/zip'
+        if export_format == 'xlsx':
+            # ZIP com arquivos separados por funcionário, enviado à medida que é gerado
+            from utils.excel_export import iter_export_zip, EXPORT_FILENAME
+            
+            # EXPORT_WORKERS > 1: planilhas geradas em paralelo por um pool de processos
+            workers = current_app.config.get('EXPORT_WORKERS', 0)
+            # Só vai para o initializer do pool (uma vez por processo), não para cada tarefa
+            database_url = db.engine.url.render_as_string(hide_password=False)
+            cache = current_app.config.get('EXPORT_CACHE_ENABLED', False)
+            chunks = iter_export_zip(employees, workers, database_url, cache)
+            filename, mimetype = EXPORT_FILENAME, 'application/zip'
+        else:
+            # CSV (ZIP por funcionário ou arquivo único), Parquet ou Arrow a partir de uma consulta
+            combined = request.args.get('combined', '').lower() in ('1', 'true', 'yes')
+            try:
+                chunks, filename, mimetype = tabular_export(export_format, combined)
+            except ExportFormatUnavailable as e:
+                return jsonify({'success': False, 'message': str(e)}), 501
+        
+        def generate():
+            try:
+                yield from chunks
+            except Exception as e:
+                # Os cabeçalhos já foram enviados: apenas registrar e encerrar o stream
+                current_app.logger.error(f"Erro ao exportar dados: {str(e)}")
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
         
     except Exception as e:
@@ -463,131 +389,121 @@ def get_team_progress():
 def api_weekly_data():
     """Endpoint para dados semanais - COM CACHE"""
     try:
-        # Verificar cache primeiro
-        cache_key = 'weekly_data'
-        cached_data = get_cached_data(cache_key)
-        if cached_data:
-            return jsonify(cached_data)
-        
-        # Se não estiver em cache, buscar dados
+        # Usar cache (recalcula apenas se expirado ou se houve escrita)
         from utils.data_processing import get_weekly_progress_data
-        weekly_data = get_weekly_progress_data()
-        
-        # Armazenar no cache
-        set_cached_data(cache_key, weekly_data)
+        weekly_data = result_cache.get_or_compute(daily_cache_key('weekly_data'), get_weekly_progress_data)
         
         return jsonify(weekly_data)
     except Exception as e:
         current_app.logger.error(f"Erro ao obter dados semanais: {str(e)}")
-        return jsonify({'error': 'Erro interno do servidor'}), 500
+        # Gráfico vazio nesta resposta (nada é guardado no cache)
+        return jsonify({'labels': [], 'datasets': []})
 
 @api_bp.route('/api/monthly_data')
 def api_monthly_data():
     """Endpoint para dados mensais - COM CACHE"""
     try:
-        # Verificar cache primeiro
-        cache_key = 'monthly_data'
-        cached_data = get_cached_data(cache_key)
-        if cached_data:
-            return jsonify(cached_data)
-        
-        # Se não estiver em cache, buscar dados
+        # Usar cache (recalcula apenas se expirado ou se houve escrita)
         from utils.data_processing import get_monthly_evolution_data
-        monthly_data = get_monthly_evolution_data()
-        
-        # Armazenar no cache
-        set_cached_data(cache_key, monthly_data)
+        monthly_data = result_cache.get_or_compute(daily_cache_key('monthly_data'), get_monthly_evolution_data)
         
         return jsonify(monthly_data)
     except Exception as e:
         current_app.logger.error(f"Erro ao obter dados mensais: {str(e)}")
-        return jsonify({'error': 'Erro interno do servidor'}), 500
+        # Gráfico vazio nesta resposta (nada é guardado no cache)
+        return jsonify({'labels': [], 'points': [], 'goals': []})
 
 @api_bp.route('/api/daily_data')
 def api_daily_data():
     """Endpoint para dados diários - COM CACHE"""
     try:
-        # Verificar cache primeiro
-        cache_key = 'daily_data'
-        cached_data = get_cached_data(cache_key)
-        if cached_data:
-            return jsonify(cached_data)
-        
-        # Se não estiver em cache, buscar dados
+        # Usar cache (recalcula apenas se expirado ou se houve escrita)
         from utils.data_processing import get_daily_data
-        daily_data = get_daily_data()
-        
-        # Armazenar no cache
-        set_cached_data(cache_key, daily_data)
+        daily_data = result_cache.get_or_compute(daily_cache_key('daily_data'), get_daily_data)
         
         return jsonify(daily_data)
     except Exception as e:
         current_app.logger.error(f"Erro ao obter dados diários: {str(e)}")
-        return jsonify({'error': 'Erro interno do servidor'}), 500
+        # Gráfico vazio nesta resposta (nada é guardado no cache)
+        return jsonify({'labels': [], 'datasets': []})
+
+def serialize_entry_row(row):
+    """Linha projetada de entry_rows_query no formato JSON da API"""
+    return {
+        'id': row.id,
+        'date': str(row.date),
+        'employee_name': row.employee_name,
+        'refinery': row.refinery,
+        'points': row.points,
+        'observations': row.observations
+    }
 
 @api_bp.route('/api/entries')
 def api_entries():
-    """Endpoint para obter registros"""
+    """Endpoint para obter registros.
+
+    Com o parâmetro `cursor` (vazio na primeira página) usa paginação por
+    cursor: retorna `next_cursor` em vez de páginas numeradas e não executa
+    COUNT(*); `include_total=1` acrescenta um total aproximado. Sem `cursor`
+    mantém a paginação por página/OFFSET.
+    """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         employee_id = request.args.get('employee_id', type=int)
         week = request.args.get('week', type=str)
+        cursor = request.args.get('cursor', type=str)
 
-        current_app.logger.info(f"🔍 DEBUG: Iniciando api_entries")
-        current_app.logger.info(f"🔍 DEBUG: page={page}, per_page={per_page}, employee_id={employee_id}, week={week}")
+        current_app.logger.debug(f"api_entries: page={page}, per_page={per_page}, employee_id={employee_id}, week={week}, cursor={cursor}")
 
-        query = Entry.query.join(Employee)
-        current_app.logger.info(f"🔍 DEBUG: Query criada com JOIN Employee")
+        # Projeção (colunas + nome do funcionário via JOIN), sem objetos ORM
+        from utils.calculations import entry_rows_query
+        query = entry_rows_query()
         
         if employee_id:
             query = query.filter(Entry.employee_id == employee_id)
-            current_app.logger.info(f"🔍 DEBUG: Filtro por employee_id={employee_id} aplicado")
 
         # ✅ CORREÇÃO: ADICIONAR FILTRO DE SEMANA
+        start_date = end_date = None
         if week and week != '':
-            current_app.logger.info(f"🔍 DEBUG: Aplicando filtro de semana: {week}")
             # Usar filtro por data como na versão que funciona
-            from utils.calculations import get_week_dates
+            from utils.calculations import get_week_dates, entry_date_range
             start_date, end_date = get_week_dates(week)
-            current_app.logger.info(f"🔍 DEBUG: Semana {week} - De {start_date} até {end_date}")
             
             # Filtrar por data da semana
-            query = query.filter(
-                func.date(Entry.date) >= start_date, 
-                func.date(Entry.date) <= end_date
-            )
-            current_app.logger.info(f"🔍 DEBUG: Filtro de data aplicado: {start_date} <= date <= {end_date}")
+            query = query.filter(*entry_date_range(start_date, end_date))
+            current_app.logger.debug(f"api_entries: semana {week} de {start_date} até {end_date}")
 
-        # Paginação
-        pagination = query.order_by(Entry.date.desc()).paginate(
+        if cursor is not None:
+            from utils.pagination import keyset_page, InvalidCursor, MAX_PAGE_SIZE
+            per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+            try:
+                rows, next_cursor = keyset_page(query, cursor, per_page)
+            except InvalidCursor:
+                return jsonify({'error': 'Cursor inválido'}), 400
+            
+            pagination = {
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            if request.args.get('include_total', type=int):
+                from utils.calculations import approximate_entry_count
+                pagination['approximate_total'] = approximate_entry_count(employee_id, start_date, end_date)
+            
+            return jsonify({
+                'entries': [serialize_entry_row(row) for row in rows],
+                'pagination': pagination
+            })
+
+        # Paginação numerada, com a mesma ordenação estável do modo cursor
+        from utils.pagination import keyset_order
+        pagination = query.order_by(*keyset_order()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
-        current_app.logger.info(f"🔍 DEBUG: Paginação criada - total={pagination.total}, pages={pagination.pages}")
-        
-        entries_data = []
-        current_app.logger.info(f"🔍 DEBUG: Processando {len(pagination.items)} registros")
-        
-        for i, entry in enumerate(pagination.items):
-            current_app.logger.info(f"🔍 DEBUG: Processando registro {i+1}/{len(pagination.items)}")
-            
-            if hasattr(entry, 'employee') and entry.employee:
-                current_app.logger.info(f"🔍 DEBUG: Employee encontrado: {entry.employee.real_name}")
-                
-                entries_data.append({
-                    'id': entry.id,
-                    'date': entry.date.strftime('%Y-%m-%d %H:%M:%S') if hasattr(entry.date, 'strftime') else str(entry.date),
-                    'employee_name': entry.employee.real_name,
-                    'refinery': entry.refinery,
-                    'points': entry.points,
-                    'observations': entry.observations
-                })
-            else:
-                current_app.logger.warning(f"🔍 DEBUG: Employee não encontrado para entry {entry.id}")
-        
         return jsonify({
-            'entries': entries_data,
+            'entries': [serialize_entry_row(row) for row in pagination.items],
             'pagination': {
                 'page': pagination.page,
                 'pages': pagination.pages,
@@ -609,8 +525,10 @@ def cache_stats():
         stats = get_cache_stats()
         return jsonify({
             'cache_stats': stats,
-            'cache_size': len(_cache),
-            'cache_timeout': _cache_timeout
+            'cache_size': stats['size'],
+            'cache_bytes': stats['bytes'],
+            'cache_evictions': stats['evictions'],
+            'cache_timeout': result_cache.ttl
         })
     except Exception as e:
         current_app.logger.error(f"Erro ao obter estatísticas do cache: {str(e)}")
@@ -1,6 +1,6 @@
 from flask import Blueprint, session, redirect, url_for, jsonify
-from models import Employee, Entry
-from utils.calculations import get_available_weeks, get_current_week, get_week_dates
+from models import db, Employee, Entry
+from utils.calculations import get_available_weeks, get_current_week, get_week_dates, entry_date_range, entry_rows_query
 
 diagnostics_bp = Blueprint('diagnostics', __name__)
 
@@ -10,13 +10,13 @@ def diagnostico():
         return redirect(url_for('auth.index'))
     
     try:
-        # Verificar funcionários
-        employees = Employee.query.all()
+        # Verificar funcionários (apenas as colunas exibidas)
+        employees = db.session.query(Employee.id, Employee.real_name, Employee.username).all()
         employee_count = len(employees)
         
-        # Verificar entradas
-        entries = Entry.query.all()
-        entry_count = len(entries)
+        # Verificar entradas (contagem no banco; detalhes só das 10 primeiras)
+        entry_count = Entry.query.count()
+        entries = entry_rows_query().order_by(Entry.id).limit(10).all()
         
         # Verificar semanas disponíveis
         available_weeks = get_available_weeks()
@@ -26,11 +26,9 @@ def diagnostico():
         start_date, end_date = get_week_dates(current_week)
         
         # Verificar entradas da semana atual
-        current_entries = Entry.query.filter(
-            Entry.date >= start_date,
-            Entry.date <= end_date
-        ).all()
-        current_entry_count = len(current_entries)
+        current_entry_count = Entry.query.filter(
+            *entry_date_range(start_date, end_date)
+        ).count()
         
         # Preparar resultado
         result = {
@@ -47,10 +45,10 @@ def diagnostico():
                 "semana_atual": current_entry_count,
                 "detalhes": [{
                     "id": entry.id,
-                    "funcionario": entry.employee.real_name,
+                    "funcionario": entry.employee_name,
                     "data": entry.date,
                     "pontos": entry.points
-                } for entry in entries[:10]]  # Mostrar apenas as 10 primeiras
+                } for entry in entries]  # Mostrar apenas as 10 primeiras
             },
             "semanas": {
                 "atual": current_week,
@@ -1,8 +1,24 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 import os
+import copy
 import logging
 import pandas as pd
 from datetime import datetime
+from utils.cycle_calendar import cycle_calendar
+from utils.result_cache import result_cache
+from utils.excel_ingest import (
+    DATE_KEYWORDS,
+    EMPLOYEE_KEYWORDS,
+    POINTS_KEYWORDS,
+    REFINERY_KEYWORDS,
+    employee_name_from_path,
+    extract_files,
+    files_signature,
+    load_records,
+    month_totals,
+    record_dicts,
+    refinery_totals
+)
 import glob
 import time
 import traceback
@@ -29,8 +45,10 @@ excel_data = {
     }
 }
 
-# Cache para performance
-_processing_cache = {}
+# Cache para performance (backend compartilhado entre workers; chaves com o
+# prefixo do blueprint para não colidir com o excel_dashboard_simple)
+PROCESSING_CACHE_PREFIX = 'excel_dashboard:processing:'
+EXCEL_DATA_KEY = 'excel_dashboard:data'
 
 @excel_dashboard_bp.route('/excel')
 def excel_dashboard():
@@ -52,7 +70,7 @@ def excel_status():
         return jsonify({
             'status': 'success',
             'message': 'Aba Excel carregada com sucesso',
-            'cache_size': len(_processing_cache)
+            'cache_size': result_cache.backend.size()
         })
     except Exception as e:
         logger.error(f"Erro no status Excel: {str(e)}")
@@ -77,15 +95,16 @@ def load_folder():
                 'message': f'Pasta "{folder_path}" não encontrada'
             }), 404
         
-        # Verificar cache
-        cache_key = f"{folder_path}_{os.path.getmtime(folder_path)}"
-        if cache_key in _processing_cache:
+        # Verificar cache (muda quando qualquer arquivo lido é alterado, incluído ou removido)
+        cache_key = f"{PROCESSING_CACHE_PREFIX}{folder_path}_{files_signature(find_folder_files(folder_path))}"
+        cached_data = result_cache.load(cache_key)
+        if cached_data is not None:
             logger.info("Retornando dados do cache")
             return jsonify({
                 'status': 'success',
                 'message': 'Dados carregados do cache',
-                'data': _processing_cache[cache_key],
-                'statistics': _processing_cache[cache_key]['statistics'],
+                'data': cached_data,
+                'statistics': cached_data['statistics'],
                 'cached': True
             })
         
@@ -97,8 +116,11 @@ def load_folder():
             global excel_data
             excel_data.update(result['data'])
             
-            # Salvar no cache
-            _processing_cache[cache_key] = excel_data.copy()
+            # Salvar no cache compartilhado (visível para todos os workers)
+            # (cópia única: excel_data é alterado no próximo processamento)
+            snapshot = copy.deepcopy(excel_data)
+            result_cache.store(cache_key, snapshot)
+            result_cache.store(EXCEL_DATA_KEY, snapshot)
             
             processing_time = time.time() - start_time
             logger.info(f"Processamento concluído em {processing_time:.2f}s")
@@ -122,14 +144,19 @@ def load_folder():
             'message': f'Erro interno: {str(e)}'
         }), 500
 
+def find_folder_files(folder_path):
+    """Arquivos Excel processados da pasta (apenas o primeiro nível), em ordem determinística"""
+    excel_files = sorted(glob.glob(os.path.join(folder_path, "*.xlsx")))
+    excel_files.extend(sorted(glob.glob(os.path.join(folder_path, "*.xls"))))
+    return excel_files
+
 def process_excel_files(folder_path):
     """Processar arquivos Excel da pasta especificada"""
     start_time = time.time()
     
     try:
         # Buscar arquivos Excel
-        excel_files = glob.glob(os.path.join(folder_path, "*.xlsx"))
-        excel_files.extend(glob.glob(os.path.join(folder_path, "*.xls")))
+        excel_files = find_folder_files(folder_path)
         
         if not excel_files:
             logger.warning(f"Nenhum arquivo Excel encontrado em: {folder_path}")
@@ -146,23 +173,23 @@ def process_excel_files(folder_path):
         excel_data['statistics']['total_files'] = len(excel_files)
         excel_data['statistics']['total_records'] = 0
         
-        # Processar cada arquivo
+        # Ler os arquivos novos/alterados (em paralelo com EXCEL_LOAD_WORKERS > 1) e mesclar na ordem dos arquivos
+        workers = current_app.config.get('EXCEL_LOAD_WORKERS', 0)
+        cache_dir = current_app.config.get('EXCEL_PARSE_CACHE_DIR')
+        file_results = extract_files(extract_data_from_excel, excel_files, workers, cache_dir)
+        
         processed_files = 0
         total_records = 0
         
-        for file_path in excel_files:
+        for file_path, file_result in zip(excel_files, file_results):
             try:
-                file_start_time = time.time()
-                file_result = extract_data_from_excel(file_path)
-                
                 if file_result['status'] == 'success':
                     # Mesclar dados
                     merge_excel_data(file_result['data'])
                     processed_files += 1
                     total_records += len(file_result['data'].get('records', []))
                     
-                    file_time = time.time() - file_start_time
-                    logger.info(f"Arquivo {os.path.basename(file_path)} processado em {file_time:.2f}s")
+                    logger.info(f"Arquivo {os.path.basename(file_path)} processado")
                 else:
                     logger.warning(f"Erro ao processar {file_path}: {file_result['message']}")
                     
@@ -197,19 +224,25 @@ def process_excel_files(folder_path):
         }
 
 def extract_data_from_excel(file_path):
-    """Extrair dados de um arquivo Excel"""
+    """Extrair dados de um arquivo Excel (operações vetorizadas por coluna)"""
     try:
         logger.info(f"Processando arquivo: {file_path}")
         
-        # Ler arquivo Excel
-        df = pd.read_excel(file_path, engine='openpyxl')
+        # Ler a planilha (em blocos, se for grande) identificando as colunas uma vez
+        columns, frame = load_records(file_path, [
+            ('date', DATE_KEYWORDS),
+            ('employee', EMPLOYEE_KEYWORDS),
+            ('points', POINTS_KEYWORDS),
+            ('refinery', REFINERY_KEYWORDS)
+        ])
         
-        # Verificar se o DataFrame tem dados
-        if df.empty:
+        # Verificar se a planilha tem dados
+        if frame is None:
             return {
                 'status': 'error',
                 'message': 'Arquivo vazio'
             }
+        logger.info(f"Colunas identificadas: {columns}")
         
         # Processar dados específicos
         file_data = {
@@ -218,114 +251,17 @@ def extract_data_from_excel(file_path):
             'records': []
         }
         
-        # Tentar identificar colunas relevantes
-        columns = df.columns.tolist()
-        logger.info(f"Colunas encontradas: {columns}")
-        
-        # Mapear colunas baseado na estrutura conhecida
-        date_column = None
-        employee_column = None
-        points_column = None
-        refinery_column = None
-        
-        for col in columns:
-            col_lower = col.lower()
-            if any(keyword in col_lower for keyword in ['data', 'date', 'dia']):
-                date_column = col
-            elif any(keyword in col_lower for keyword in ['funcionario', 'employee', 'nome', 'name']):
-                employee_column = col
-            elif any(keyword in col_lower for keyword in ['ponto', 'pontos', 'valor', 'value', 'total']):
-                points_column = col
-            elif any(keyword in col_lower for keyword in ['refinaria', 'refinery']):
-                refinery_column = col
-        
-        # Se não encontrou colunas específicas, usar padrões conhecidos
-        if not date_column and 'Data' in columns:
-            date_column = 'Data'
-        if not points_column and 'Pontos' in columns:
-            points_column = 'Pontos'
-        if not refinery_column and 'Refinaria' in columns:
-            refinery_column = 'Refinaria'
-        
         # Extrair nome do funcionário do nome do arquivo
-        file_name = os.path.basename(file_path)
-        employee_name = file_name.replace('.xlsx', '').replace('.xls', '')
-        
-        # Processar cada linha do DataFrame
-        for index, row in df.iterrows():
-            try:
-                # Pular linha de cabeçalho se necessário
-                if index == 0 and isinstance(row.iloc[0], str) and 'Data' in str(row.iloc[0]):
-                    continue
-                
-                # Extrair dados da linha
-                date_value = None
-                points_value = 0
-                refinery_value = None
-                
-                # Extrair data
-                if date_column and pd.notna(row[date_column]):
-                    try:
-                        date_value = pd.to_datetime(row[date_column])
-                    except:
-                        logger.warning(f"Erro ao converter data: {row[date_column]}")
-                
-                # Extrair pontos
-                if points_column and pd.notna(row[points_column]):
-                    try:
-                        points_value = float(row[points_column])
-                    except:
-                        logger.warning(f"Erro ao converter pontos: {row[points_column]}")
-                
-                # Extrair refinaria
-                if refinery_column and pd.notna(row[refinery_column]):
-                    refinery_value = str(row[refinery_column]).strip()
-                
-                # Processar dados se válidos
-                if employee_name and points_value > 0:
-                    # Determinar mês baseado na data (26º ao 25º)
-                    month_key = get_month_from_date(date_value) if date_value else 'Sem Data'
-                    
-                    # Adicionar ao funcionário
-                    if employee_name not in file_data['employees']:
-                        file_data['employees'][employee_name] = {
-                            'total': 0,
-                            'records': 0,
-                            'refineries': {},
-                            'months': {}  # ✅ ADICIONAR: Dados por mês
-                        }
-                    
-                    file_data['employees'][employee_name]['total'] += points_value
-                    file_data['employees'][employee_name]['records'] += 1
-                    
-                    # Adicionar refinaria
-                    if refinery_value:
-                        if refinery_value not in file_data['employees'][employee_name]['refineries']:
-                            file_data['employees'][employee_name]['refineries'][refinery_value] = 0
-                        file_data['employees'][employee_name]['refineries'][refinery_value] += points_value
-                    
-                    # ✅ CORREÇÃO: Adicionar ao mês corretamente
-                    if month_key not in file_data['employees'][employee_name]['months']:
-                        file_data['employees'][employee_name]['months'][month_key] = {
-                            'points': 0,
-                            'records': 0
-                        }
-                    
-                    file_data['employees'][employee_name]['months'][month_key]['points'] += points_value
-                    file_data['employees'][employee_name]['months'][month_key]['records'] += 1
-                    
-                    # Adicionar registro individual
-                    file_data['records'].append({
-                        'employee': employee_name,
-                        'date': date_value,
-                        'points': points_value,
-                        'month': month_key,
-                        'refinery': refinery_value
-                    })
-                
-            except Exception as e:
-                logger.warning(f"Erro ao processar linha {index}: {str(e)}")
-                continue
+        employee_name = employee_name_from_path(file_path, strip_month=False)
+        
+        if employee_name and not frame.empty:
+            file_data['employees'][employee_name] = {
+                'total': float(frame['points'].sum()),
+                'records': len(frame),
+                'refineries': refinery_totals(frame),
+                'months': month_totals(frame)
+            }
+            file_data['records'] = record_dicts(frame, employee_name)
         
         logger.info(f"Processado arquivo com {len(file_data['records'])} registros válidos")
         
@@ -352,28 +288,8 @@ def get_month_from_date(date_value):
         if isinstance(date_value, str):
             date_value = pd.to_datetime(date_value)
         
-        # Extrair dia e mês
-        day = date_value.day
-        month = date_value.month
-        year = date_value.year
-        
-        # Lógica: se dia >= 26, pertence ao mês atual
-        # Se dia < 26, pertence ao mês anterior
-        if day >= 26:
-            # Permanecer no mês atual
-            target_month = month
-            target_year = year
-        else:
-            # Ir para o mês anterior
-            if month == 1:
-                target_month = 12
-                target_year = year - 1
-            else:
-                target_month = month - 1
-                target_year = year
-        
-        # Formatar como "MM/YYYY"
-        month_key = f"{target_month:02d}/{target_year}"
+        # Mês da empresa: 26 do mês anterior ao 25 do mês (ex.: 26/03 a 25/04 → 04)
+        month_key = cycle_calendar.month_key(date_value)
         
         return month_key
         
@@ -479,9 +395,11 @@ def calculate_final_statistics():
 def get_excel_data():
     """Endpoint para obter dados processados"""
     try:
+        # Preferir o snapshot compartilhado: o load pode ter ocorrido em outro worker
+        shared_data = result_cache.load(EXCEL_DATA_KEY)
         return jsonify({
             'status': 'success',
-            'data': excel_data
+            'data': shared_data if shared_data is not None else excel_data
         })
     except Exception as e:
         logger.error(f"Erro ao obter dados: {str(e)}")
@@ -1,8 +1,24 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app, session
 import os
 import logging
 import pandas as pd
 from datetime import datetime
+from utils.cycle_calendar import cycle_calendar
+from utils.result_cache import result_cache
+from utils.excel_import import IMPORT_BATCH_SIZE, import_records
+from utils.excel_ingest import (
+    DEFAULT_DEDUP_KEY,
+    DATE_KEYWORDS,
+    POINTS_KEYWORDS,
+    REFINERY_KEYWORDS,
+    employee_name_from_path,
+    extract_files,
+    find_excel_files,
+    load_records,
+    parse_dedup_key,
+    record_dicts,
+    refinery_totals
+)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +27,12 @@ logger = logging.getLogger(__name__)
 # Criar blueprint
 excel_dashboard_simple_bp = Blueprint('excel_dashboard_simple', __name__)
 
+# Chave do snapshot compartilhado entre workers (prefixo próprio do blueprint)
+EXCEL_DATA_KEY = 'excel_simple:data'
+
+# Índice de duplicados: funcionário → set de chaves dos registros já mesclados
+dedup_index = {}
+
 # Dados em memória
 excel_data = {
     'employees': {},
@@ -39,23 +61,10 @@ def get_custom_month(date_value):
             date_value = pd.to_datetime(date_value)
         
         day = date_value.day
-        month = date_value.month
-        year = date_value.year
-        
-        # LÓGICA CORRETA: Se dia >= 26, pertence ao mês seguinte
-        if day >= 26:
-            if month == 12:
-                target_month = 1
-                target_year = year + 1
-            else:
-                target_month = month + 1
-                target_year = year
-        else:
-            target_month = month
-            target_year = year
         
-        month_key = f"{target_month:02d}/{target_year}"
-        logger.info(f"📅 {date_value} (dia {day}) → {month_key}")
+        # Se dia >= 26, pertence ao mês seguinte (regra única em CycleCalendar)
+        month_key = cycle_calendar.month_key(date_value)
+        logger.debug("📅 %s (dia %s) → %s", date_value, day, month_key)
         
         return month_key
         
@@ -69,30 +78,29 @@ def get_month_from_date(date_value):
     return get_custom_month(date_value)
 
 def extract_data_from_excel(file_path):
-    """Extrair dados de um arquivo Excel"""
+    """Extrair dados de um arquivo Excel (operações vetorizadas por coluna)"""
     try:
         logger.info(f"Processando arquivo: {file_path}")
         
-        # Ler arquivo Excel
-        df = pd.read_excel(file_path, engine='openpyxl')
-        
-        # Verificar se o DataFrame tem dados
-        if df.empty:
+        # Ler a planilha (em blocos, se for grande) identificando as colunas uma vez;
+        # cabeçalho repetido e linha de total ignorados e registros duplicados
+        # (mesma data e pontos) contam uma vez só
+        columns, frame = load_records(file_path, [
+            ('date', DATE_KEYWORDS),
+            ('points', POINTS_KEYWORDS),
+            ('refinery', REFINERY_KEYWORDS)
+        ], skip_totals=True, drop_duplicates=True)
+        
+        # Verificar se a planilha tem dados
+        if frame is None:
             return {
                 'status': 'error',
                 'message': 'Arquivo vazio'
             }
+        logger.debug(f"Colunas identificadas: {columns}")
         
-        # Extrair nome do funcionário do nome do arquivo (remover mês)
-        file_name = os.path.basename(file_path)
-        employee_name = file_name.replace('.xlsx', '').replace('.xls', '')
-        
-        # Remover mês do nome do funcionário
-        month_patterns = [' Abril', ' Maio', ' Junho', ' Julho', ' Agosto', ' Setembro', ' Outubro', ' Novembro', ' Dezembro']
-        for pattern in month_patterns:
-            if pattern in employee_name:
-                employee_name = employee_name.replace(pattern, '')
-                break
+        # Extrair nome do funcionário do nome do arquivo (sem o mês)
+        employee_name = employee_name_from_path(file_path)
         
         # Processar dados específicos
         file_data = {
@@ -101,130 +109,14 @@ def extract_data_from_excel(file_path):
             'records': []
         }
         
-        # ✅ ADICIONAR: Set para evitar registros duplicados
-        processed_records = set()
-        
-        # Tentar identificar colunas relevantes
-        columns = df.columns.tolist()
-        logger.info(f"Colunas encontradas: {columns}")
-        
-        # Mapear colunas baseado na estrutura conhecida
-        date_column = None
-        points_column = None
-        refinery_column = None
-        
-        for col in columns:
-            col_lower = col.lower()
-            if any(keyword in col_lower for keyword in ['data', 'date', 'dia']):
-                date_column = col
-            elif any(keyword in col_lower for keyword in ['ponto', 'pontos', 'valor', 'value', 'total']):
-                points_column = col
-            elif any(keyword in col_lower for keyword in ['refinaria', 'refinery']):
-                refinery_column = col
-        
-        # Se não encontrou colunas específicas, usar padrões conhecidos
-        if not date_column and 'Data' in columns:
-            date_column = 'Data'
-        if not points_column and 'Pontos' in columns:
-            points_column = 'Pontos'
-        if not refinery_column and 'Refinaria' in columns:
-            refinery_column = 'Refinaria'
-        
-        # Processar cada linha do DataFrame
-        for index, row in df.iterrows():
-            try:
-                # Pular linha de cabeçalho se necessário
-                if index == 0 and isinstance(row.iloc[0], str) and 'Data' in str(row.iloc[0]):
-                    continue
-                
-                # Pular linha de total se existir
-                if any(col and pd.notna(row[col]) and str(row[col]).lower() == 'total' for col in [date_column, points_column]):
-                    continue
-                
-                # ✅ RESTAURAR: Processamento de registros individuais
-                # Extrair dados da linha
-                date_value = None
-                points_value = 0
-                refinery_value = None
-                
-                # Extrair data
-                if date_column and pd.notna(row[date_column]):
-                    try:
-                        date_value = pd.to_datetime(row[date_column])
-                    except:
-                        logger.warning(f"Erro ao converter data: {row[date_column]}")
-                
-                # Extrair pontos
-                if points_column and pd.notna(row[points_column]):
-                    try:
-                        points_value = float(row[points_column])
-                    except:
-                        logger.warning(f"Erro ao converter pontos: {row[points_column]}")
-                
-                # Extrair refinaria
-                if refinery_column and pd.notna(row[refinery_column]):
-                    refinery_value = str(row[refinery_column]).strip()
-                
-                # Processar dados se válidos
-                if employee_name and points_value > 0:
-                    # Determinar mês baseado na data (26º ao 25º)
-                    month_key = get_month_from_date(date_value) if date_value else 'Sem Data'
-                    
-                    # ✅ ADICIONAR: Verificar duplicação
-                    record_key = f"{date_value}_{points_value}_{employee_name}"
-                    if record_key in processed_records:
-                        logger.warning(f"⚠️ Registro duplicado no arquivo: {record_key}")
-                        continue
-                    processed_records.add(record_key)
-                    
-                    # ✅ REMOVER: Verificação de pontos suspeitos (usuário confirmou que são válidos)
-                    # if points_value > 2000:
-                    #     logger.warning(f"⚠️ Pontos muito altos detectados: {points_value} para {employee_name} em {date_value}")
-                    #     # Verificar se é realmente válido
-                    #     if points_value > 5000:
-                    #         logger.warning(f"❌ Pontos extremamente altos ignorados: {points_value}")
-                    #         continue
-                    
-                    logger.info(f"📊 Processando linha {index}: {employee_name} - {points_value} pontos - {month_key}")
-                    
-                    # Adicionar ao funcionário
-                    if employee_name not in file_data['employees']:
-                        file_data['employees'][employee_name] = {
-                            'total': 0,
-                            'records': 0,
-                            'refineries': {},
-                            'months': {}
-                        }
-                        logger.info(f"✅ Novo funcionário criado: {employee_name}")
-                    
-                    old_total = file_data['employees'][employee_name]['total']
-                    file_data['employees'][employee_name]['total'] += points_value
-                    file_data['employees'][employee_name]['records'] += 1
-                    logger.info(f"📊 Total atualizado: {old_total} + {points_value} = {file_data['employees'][employee_name]['total']}")
-                    
-                    # Adicionar refinaria
-                    if refinery_value:
-                        if refinery_value not in file_data['employees'][employee_name]['refineries']:
-                            file_data['employees'][employee_name]['refineries'][refinery_value] = 0
-                        file_data['employees'][employee_name]['refineries'][refinery_value] += points_value
-                        logger.info(f"🏭 Refinaria atualizada: {refinery_value} = {file_data['employees'][employee_name]['refineries'][refinery_value]}")
-                    
-                    # Adicionar registro individual
-                    record_data = {
-                        'employee': employee_name,
-                        'date': date_value,
-                        'points': points_value,
-                        'month': month_key,
-                        'refinery': refinery_value
-                    }
-                    file_data['records'].append(record_data)
-                    logger.info(f"📋 Registro adicionado: {record_data}")
-                else:
-                    logger.warning(f"❌ Dados inválidos na linha {index}: employee={employee_name}, points={points_value}")
-                
-            except Exception as e:
-                logger.warning(f"Erro ao processar linha {index}: {str(e)}")
-                continue
+        if employee_name and not frame.empty:
+            file_data['employees'][employee_name] = {
+                'total': float(frame['points'].sum()),
+                'records': len(frame),
+                'refineries': refinery_totals(frame),
+                'months': {}
+            }
+            file_data['records'] = record_dicts(frame, employee_name)
         
         logger.info(f"Processado arquivo com {len(file_data['records'])} registros válidos")
         
@@ -241,16 +133,22 @@ def extract_data_from_excel(file_path):
             'message': f'Erro ao ler arquivo: {str(e)}'
         }
 
-def merge_excel_data(file_data):
-    """Mesclar dados de um arquivo com os dados globais"""
+def merge_excel_data(file_data, dedup_key=DEFAULT_DEDUP_KEY):
+    """Mesclar dados de um arquivo com os dados globais.
+
+    Duplicados são detectados pelo índice `dedup_index` (um set por
+    funcionário com as chaves `dedup_key` dos registros já mesclados), em
+    O(1) por registro.
+    """
     try:
         logger.info(f"🔍 === DEBUG: MESCLANDO DADOS ===")
-        logger.info(f"📊 Dados do arquivo: {file_data}")
+        logger.debug("📊 Registros do arquivo: %d", len(file_data.get('records', [])))
+        
+        duplicates = 0
         
         # ✅ SIMPLIFICAÇÃO: Processar apenas registros individuais
         for record in file_data.get('records', []):
             employee_name = record.get('employee')
-            logger.info(f"📋 Processando registro: {record}")
             
             if employee_name not in excel_data['employees']:
                 logger.info(f"✅ Novo funcionário: {employee_name}")
@@ -261,40 +159,25 @@ def merge_excel_data(file_data):
                     'months': {}
                 }
             
-            # ✅ ADICIONAR: Verificar duplicação
-            record_key = f"{record.get('date')}_{record.get('points')}_{employee_name}"
-            existing_records = excel_data['employees'][employee_name]['records']
-            
-            # Verificar se registro já existe
-            is_duplicate = False
-            for existing_record in existing_records:
-                existing_key = f"{existing_record.get('date')}_{existing_record.get('points')}_{employee_name}"
-                if record_key == existing_key:
-                    logger.warning(f"⚠️ Registro duplicado detectado: {record_key}")
-                    is_duplicate = True
-                    break
-            
-            # ✅ ADICIONAR: Verificar duplicação por data e hora (mesmo dia, mesma hora)
-            if not is_duplicate:
-                for existing_record in existing_records:
-                    if (existing_record.get('date') == record.get('date') and 
-                        existing_record.get('points') == record.get('points')):
-                        logger.warning(f"⚠️ Registro duplicado por data/hora: {record.get('date')} - {record.get('points')} pontos")
-                        is_duplicate = True
-                        break
+            # ✅ Verificar duplicação (ex.: mesma data e mesmos pontos)
+            record_key = tuple(record.get(field) for field in dedup_key)
+            seen = dedup_index.setdefault(employee_name, set())
+            if record_key in seen:
+                duplicates += 1
+                logger.debug("⏭️ Registro duplicado ignorado: %s %s", employee_name, record_key)
+                continue
+            seen.add(record_key)
             
-            if not is_duplicate:
-                # Adicionar registro individual
-                excel_data['employees'][employee_name]['records'].append({
-                    'date': record.get('date'),
-                    'points': record.get('points'),
-                    'refinery': record.get('refinery'),
-                    'month': record.get('month')
-                })
-                logger.info(f"✅ Registro adicionado para {employee_name}")
-            else:
-                logger.info(f"⏭️ Registro duplicado ignorado: {employee_name}")
-        
+            # Adicionar registro individual
+            excel_data['employees'][employee_name]['records'].append({
+                'date': record.get('date'),
+                'points': record.get('points'),
+                'refinery': record.get('refinery'),
+                'month': record.get('month')
+            })
+        
+        if duplicates:
+            logger.warning(f"⚠️ {duplicates} registros duplicados ignorados")
         logger.info(f"✅ Mesclagem concluída")
         
     except Exception as e:
@@ -315,22 +198,13 @@ def calculate_final_statistics():
         for employee_name, employee_data in excel_data['employees'].items():
             logger.info(f"\n👤 === FUNCIONÁRIO: {employee_name} ===")
             
-            # Calcular total a partir dos registros individuais
-            employee_points = 0
-            employee_records = len(employee_data.get('records', []))
+            # Calcular total a partir dos registros individuais (sem log por registro)
+            records = employee_data.get('records', [])
+            employee_points = sum(record.get('points', 0) for record in records)
+            employee_records = len(records)
             
             logger.info(f"📋 Registros encontrados: {employee_records}")
             
-            # ✅ ADICIONAR: Debug detalhado para cada registro
-            for i, record in enumerate(employee_data.get('records', [])):
-                points = record.get('points', 0)
-                date = record.get('date')
-                month = record.get('month')
-                
-                logger.info(f"  📋 Registro {i+1}: {date} - {points} pontos - {month}")
-                employee_points += points
-                logger.info(f"  📊 Subtotal {employee_name}: {employee_points} pontos")
-            
             # Atualizar totalPoints com o valor calculado
             old_total = employee_data.get('totalPoints', 0)
             employee_data['totalPoints'] = employee_points
@@ -363,7 +237,8 @@ def calculate_final_statistics():
 
 def clear_all_data():
     """Limpar todos os dados em memória"""
-    global excel_data
+    global excel_data, dedup_index
+    dedup_index = {}
     excel_data = {
         'employees': {},
         'months': {},
@@ -377,6 +252,57 @@ def clear_all_data():
     }
     logger.info("🧹 Dados limpos com sucesso")
 
+def extract_folder_files(excel_files):
+    """Lê as planilhas encontradas na pasta; retorna (arquivos lidos, resultados na mesma ordem).
+
+    Arquivos com o mesmo nome em pastas diferentes são lidos uma vez só.
+    Usado pelo load_folder e pela importação para o banco.
+    """
+    files_to_process = []
+    processed_file_names = set()
+    for file_path in excel_files:
+        file_name = os.path.basename(file_path)
+        if file_name in processed_file_names:
+            logger.warning(f"⚠️ Arquivo já processado: {file_name}")
+            continue
+        processed_file_names.add(file_name)
+        files_to_process.append(file_path)
+
+    # Arquivos novos/alterados lidos em paralelo com EXCEL_LOAD_WORKERS > 1; os demais vêm do cache
+    workers = current_app.config.get('EXCEL_LOAD_WORKERS', 0)
+    cache_dir = current_app.config.get('EXCEL_PARSE_CACHE_DIR')
+    file_results = extract_files(extract_data_from_excel, files_to_process, workers, cache_dir)
+    return files_to_process, file_results
+
+def folder_records(folder_path):
+    """Registros de todas as planilhas da pasta (mesma leitura do load_folder).
+
+    Retorna (registros, arquivos lidos, {arquivo: mensagem de erro}).
+    """
+    files_to_process, file_results = extract_folder_files(find_excel_files(folder_path))
+
+    records = []
+    errors = {}
+    for file_path, file_result in zip(files_to_process, file_results):
+        if file_result['status'] == 'success':
+            records.extend(file_result['data']['records'])
+        else:
+            errors[os.path.basename(file_path)] = file_result['message']
+    return records, files_to_process, errors
+
+def import_folder(folder_path, dry_run=False):
+    """Lê as planilhas da pasta e grava em Entry os registros que ainda não existem"""
+    records, files, errors = folder_records(folder_path)
+    batch_size = current_app.config.get('EXCEL_IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE)
+    result = import_records(records, batch_size=batch_size, dry_run=dry_run)
+    result.update({'files': len(files), 'records': len(records), 'errors': errors})
+
+    logger.info(f"📥 Importação de {folder_path}: {result['inserted']} inseridos, "
+                f"{result['duplicates']} duplicados, {result['without_date']} sem data")
+    if result['unknown_employees']:
+        logger.warning(f"⚠️ Funcionários não encontrados: {', '.join(result['unknown_employees'])}")
+    return result
+
 @excel_dashboard_simple_bp.route('/excel')
 def excel_dashboard():
     """Rota principal da aba Excel"""
@@ -421,20 +347,11 @@ def load_folder():
         # ✅ CORREÇÃO: Limpar dados completamente
         clear_all_data()
         
-        # Contar e processar arquivos Excel
-        excel_files = []
+        # Contar e processar arquivos Excel (ordem determinística)
         logger.info(f"🔍 === BUSCANDO ARQUIVOS EXCEL ===")
-        
-        for root, dirs, files in os.walk(folder_path):
-            logger.info(f"📁 Diretório: {root}")
-            logger.info(f"📁 Subdiretórios: {dirs}")
-            logger.info(f"📄 Arquivos: {files}")
-            
-            for file in files:
-                if file.endswith(('.xlsx', '.xls')):
-                    file_path = os.path.join(root, file)
-                    excel_files.append(file_path)
-                    logger.info(f"✅ Arquivo Excel encontrado: {file_path}")
+        excel_files = find_excel_files(folder_path)
+        for file_path in excel_files:
+            logger.info(f"✅ Arquivo Excel encontrado: {file_path}")
         
         logger.info(f"📊 Total de arquivos Excel encontrados: {len(excel_files)}")
         
@@ -448,30 +365,25 @@ def load_folder():
         
         excel_data['statistics']['total_files'] = len(excel_files)
         
-        # Processar cada arquivo
-        processed_files = 0
-        processed_file_names = set()  # ✅ ADICIONAR: Para evitar duplicação
+        # Ler os arquivos (um por nome) e mesclar na ordem dos arquivos
+        files_to_process, file_results = extract_folder_files(excel_files)
         
-        for file_path in excel_files:
+        # Campos que identificam um registro duplicado (EXCEL_DEDUP_KEY)
+        dedup_key = parse_dedup_key(current_app.config.get('EXCEL_DEDUP_KEY'))
+        
+        processed_files = 0
+        for file_path, file_result in zip(files_to_process, file_results):
             try:
                 file_name = os.path.basename(file_path)
-                
-                # ✅ ADICIONAR: Verificar se arquivo já foi processado
-                if file_name in processed_file_names:
-                    logger.warning(f"⚠️ Arquivo já processado: {file_name}")
-                    continue
-                processed_file_names.add(file_name)
-                
                 logger.info(f"\n📄 === PROCESSANDO ARQUIVO ===")
                 logger.info(f"📄 Arquivo: {file_name}")
                 logger.info(f"📄 Caminho completo: {file_path}")
                 
-                file_result = extract_data_from_excel(file_path)
                 if file_result['status'] == 'success':
                     logger.info(f"✅ Arquivo processado com sucesso")
-                    logger.info(f"📊 Dados extraídos: {file_result['data']}")
+                    logger.debug("📊 Registros extraídos: %d", len(file_result['data']['records']))
                     
-                    merge_excel_data(file_result['data'])
+                    merge_excel_data(file_result['data'], dedup_key)
                     processed_files += 1
                     logger.info(f"✅ Arquivo mesclado: {file_name}")
                 else:
@@ -500,6 +412,9 @@ def load_folder():
         # Calcular estatísticas finais
         calculate_final_statistics()
         
+        # Publicar snapshot no cache compartilhado (visível para todos os workers)
+        result_cache.store(EXCEL_DATA_KEY, excel_data)
+        
         return jsonify({
             'status': 'success',
             'message': f'Processados {processed_files}/{len(excel_files)} arquivos',
@@ -512,4 +427,48 @@ def load_folder():
         return jsonify({
             'status': 'error',
             'message': f'Erro interno: {str(e)}'
-        }), 500 
\ No newline at end of file
+        }), 500 
+
+@excel_dashboard_simple_bp.route('/api/excel/import', methods=['POST'])
+def import_folder_to_database():
+    """Endpoint para importar os registros da pasta de Excel para o banco"""
+    if 'role' not in session or session['role'] != 'ceo':
+        return jsonify({'status': 'error', 'message': 'Acesso negado'}), 403
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        folder_path = data.get('folder_path', 'registros monitorar')
+        
+        if not os.path.exists(folder_path):
+            return jsonify({
+                'status': 'error',
+                'message': f'Pasta "{folder_path}" não encontrada'
+            }), 404
+        
+        result = import_folder(folder_path, dry_run=bool(data.get('dry_run')))
+        return jsonify({
+            'status': 'success',
+            'message': f'{result["inserted"]} registros importados, {result["duplicates"]} já existentes',
+            'result': result
+        })
+    
+    except Exception as e:
+        logger.error(f"Erro ao importar pasta: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Erro interno: {str(e)}'
+        }), 500
+
+@excel_dashboard_simple_bp.route('/api/excel/data')
+def get_excel_data():
+    """Endpoint para obter dados processados"""
+    try:
+        # Preferir o snapshot compartilhado: o load pode ter ocorrido em outro worker
+        shared_data = result_cache.load(EXCEL_DATA_KEY)
+        return jsonify({
+            'status': 'success',
+            'data': shared_data if shared_data is not None else excel_data
+        })
+    except Exception as e:
+        logger.error(f"Erro ao obter dados: {str(e)}")
+        return jsonify({'error': 'Erro interno'}), 500
\ No newline at end of file
@@ -2,6 +2,8 @@
 // Variáveis globais para controle de estado
 let currentPage = 1;
 let currentSelectedWeek = '';
+// Cursores das páginas do histórico já visitadas (índice = página - 1; página 1 = cursor vazio)
+let historyCursors = [''];
 
 // Função para inicializar os gráficos do dashboard do funcionário
 function initEmployeeDashboard(monthlyData, weeklyData) {
@@ -152,7 +154,19 @@ function initEmployeeDashboard(monthlyData, weeklyData) {
           currentSelectedWeek = selectedWeek;
       }
       
-      let url = `/api/entries?page=${page}&employee_id=${window.employeeId || ''}`;
+      // Todas as páginas via cursor (mesma ordenação): a página 1 recomeça a
+      // navegação e as seguintes usam o next_cursor da página anterior
+      if (page <= 1) {
+          page = 1;
+          historyCursors = [''];
+      }
+      const cursor = historyCursors[page - 1];
+      if (cursor === undefined || cursor === null) {
+          console.log('Página de histórico indisponível:', page);
+          return;
+      }
+      
+      let url = `/api/entries?cursor=${encodeURIComponent(cursor)}&employee_id=${window.employeeId || ''}`;
       if (currentSelectedWeek && currentSelectedWeek !== '') {
           url += `&week=${currentSelectedWeek}`;
       }
@@ -164,6 +178,8 @@ function initEmployeeDashboard(monthlyData, weeklyData) {
               if (data.entries) {
                   renderHistory(data.entries);
                   currentPage = page;
+                  historyCursors = historyCursors.slice(0, page);
+                  historyCursors.push(data.pagination ? data.pagination.next_cursor : null);
                   // Atualizar controles de paginação se necessário
                   updatePaginationControls(data.pagination);
               }
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Banco e cache isolados, definidos antes de importar o app (a configuração é lida no import)
+_tmpdir = tempfile.mkdtemp(prefix='monitorar_tests_')
+os.environ['FLASK_ENV'] = 'production'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ['RESULT_CACHE_BACKEND'] = 'memory'
+os.environ['EXCEL_PARSE_CACHE_DIR'] = ''
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from models import db, Employee, Entry  # noqa: E402
+from utils.result_cache import result_cache  # noqa: E402
+from utils.rollup import clear_rollup  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        Entry.query.delete()
+        clear_rollup()
+        Employee.query.delete()
+        db.session.commit()
+        result_cache.invalidate()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def employee(app):
+    employee = Employee(name='Teste', real_name='Teste', username='T001', access_key='k')
+    db.session.add(employee)
+    db.session.commit()
+    return employee
+
+
+def login(client, role, user_id, real_name='Teste'):
+    with client.session_transaction() as session:
+        session['role'] = role
+        session['user_id'] = user_id
+        session['real_name'] = real_name
@@ -0,0 +1,35 @@
+import os
+import stat
+
+import pytest
+
+from utils.cache_backends import SQLiteBackend, ensure_private_directory
+from utils.excel_ingest import extract_files
+
+
+def extract_stub(file_path):
+    return {'status': 'success', 'data': file_path}
+
+
+def test_cache_directory_is_created_private(tmp_path):
+    path = ensure_private_directory(str(tmp_path / 'cache'))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='permissões POSIX')
+def test_world_writable_directory_is_refused(tmp_path):
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        ensure_private_directory(str(shared))
+    with pytest.raises(PermissionError):
+        SQLiteBackend(path=str(shared / 'cache.sqlite3'))
+
+    # Cache de planilhas ignorado: o arquivo é lido de novo e nada é gravado no diretório
+    sheet = tmp_path / 'planilha.xlsx'
+    sheet.write_bytes(b'conteudo')
+    assert extract_files(extract_stub, [str(sheet)], cache_dir=str(shared)) == [
+        {'status': 'success', 'data': str(sheet)}
+    ]
+    assert os.listdir(shared) == []
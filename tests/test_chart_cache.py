@@ -0,0 +1,19 @@
+import utils.data_processing
+
+from conftest import login
+
+
+def test_chart_error_is_not_cached(client, employee, monkeypatch):
+    login(client, 'ceo', 'ceo_001', 'CEO')
+
+    def failing_totals(*args, **kwargs):
+        raise RuntimeError('banco indisponível')
+
+    # Falha transitória: a rota responde vazio...
+    with monkeypatch.context() as patch:
+        patch.setattr(utils.data_processing, 'weekly_totals_by_employee', failing_totals)
+        assert client.get('/api/weekly_data').get_json() == {'labels': [], 'datasets': []}
+
+    # ...mas o vazio não fica no cache
+    data = client.get('/api/weekly_data').get_json()
+    assert [dataset['label'] for dataset in data['datasets']] == ['Teste']
@@ -0,0 +1,41 @@
+from models import db, Entry
+
+from conftest import login
+
+
+def add_entries(employee, dates):
+    for index, date in enumerate(dates):
+        db.session.add(Entry(employee_id=employee.id, date=date, refinery='REVAP', points=index))
+    db.session.commit()
+
+
+# Mesmo instante em formatos de string diferentes e vários registros empatados
+DATES = ['2026-10-01 08:00:00'] * 4 + ['2026-10-01 08:00', '2026-10-01', '2026-09-30 19:00:00', '2026-10-02']
+
+
+def test_cursor_pages_cover_every_entry_once(client, employee):
+    add_entries(employee, DATES)
+    login(client, 'employee', employee.id)
+
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        data = client.get(f'/api/entries?cursor={cursor}&per_page=3&employee_id={employee.id}').get_json()
+        seen += [entry['id'] for entry in data['entries']]
+        cursor = data['pagination']['next_cursor']
+
+    assert sorted(seen) == sorted(entry.id for entry in Entry.query.all())
+    assert len(seen) == len(set(seen))
+
+
+def test_numbered_pages_use_cursor_order(client, employee):
+    add_entries(employee, DATES)
+    login(client, 'employee', employee.id)
+
+    numbered = []
+    for page in (1, 2, 3):
+        data = client.get(f'/api/entries?page={page}&per_page=3&employee_id={employee.id}').get_json()
+        numbered += [entry['id'] for entry in data['entries']]
+    cursor_page = client.get(f'/api/entries?cursor=&per_page=50&employee_id={employee.id}').get_json()
+
+    assert numbered == [entry['id'] for entry in cursor_page['entries']]
@@ -0,0 +1,42 @@
+import pytest
+
+from utils.cache_backends import MemoryBackend, SQLiteBackend
+from utils.result_cache import LEASE_PREFIX, ResultCache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend(max_entries=2)
+    return SQLiteBackend(path=str(tmp_path / 'cache' / 'cache.sqlite3'), max_entries=2)
+
+
+def test_lease_is_released_after_compute(backend):
+    cache = ResultCache(backend=backend)
+    assert cache.get_or_compute('valor', lambda: 1) == 1
+    assert backend.lease_owner(LEASE_PREFIX + 'valor') is None
+
+
+def test_timed_out_wait_keeps_foreign_lease(backend):
+    cache = ResultCache(backend=backend, lock_timeout=1)
+    # Outro worker ainda está calculando a mesma chave
+    assert backend.acquire_lease(LEASE_PREFIX + 'valor', 'outro-worker', 60)
+
+    assert cache.get_or_compute('valor', lambda: 1) == 1
+    assert backend.lease_owner(LEASE_PREFIX + 'valor') == 'outro-worker'
+
+
+def test_leases_survive_eviction(backend):
+    assert backend.acquire_lease('calculo', 'worker-1', 60)
+    for index in range(5):
+        backend.set(f'valor:{index}', index)
+
+    # LRU descarta só valores; o lease continua e não ocupa espaço de valor
+    assert backend.lease_owner('calculo') == 'worker-1'
+    assert not backend.acquire_lease('calculo', 'worker-2', 60)
+    assert backend.size() == 2
+
+    backend.release_lease('calculo', 'worker-2')
+    assert backend.lease_owner('calculo') == 'worker-1'
+    backend.release_lease('calculo', 'worker-1')
+    assert backend.acquire_lease('calculo', 'worker-2', 60)
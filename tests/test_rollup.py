@@ -0,0 +1,86 @@
+from sqlalchemy import func
+
+from models import db, DailyRollup, Entry
+from utils.cycle_calendar import cycle_calendar
+from utils.rollup import clear_rollup, ensure_daily_rollup
+
+from conftest import login
+
+
+def totals():
+    """(pontos, registros) em Entry e no daily_rollup"""
+    db.session.expire_all()
+    entry_totals = db.session.query(
+        func.coalesce(func.sum(Entry.points), 0), func.count(Entry.id)
+    ).filter(Entry.date_time.isnot(None)).one()
+    rollup_totals = db.session.query(
+        func.coalesce(func.sum(DailyRollup.points), 0), func.coalesce(func.sum(DailyRollup.entries), 0)
+    ).one()
+    return tuple(entry_totals), tuple(rollup_totals)
+
+
+def assert_rollup_matches():
+    entry_totals, rollup_totals = totals()
+    assert entry_totals == rollup_totals
+
+
+def register(client, date, refinery, points):
+    return client.post('/register_points', data={
+        'date': date, 'refinery': refinery, 'points': str(points), 'observations': ''
+    })
+
+
+def test_rollup_follows_register_edit_delete(client, employee):
+    login(client, 'employee', employee.id)
+    register(client, '2026-10-01', 'REVAP', 500)
+    register(client, '2026-10-01', 'REPLAN', 300)
+    register(client, '2026-10-02', 'REVAP', 200)
+    assert totals()[0] == (1000, 3)
+    assert_rollup_matches()
+
+    entry = Entry.query.filter_by(points=300).one()
+    login(client, 'ceo', 'ceo_001', 'CEO')
+    client.post(f'/edit_entry/{entry.id}', data={
+        'date': '2026-10-03', 'time': '08:00', 'refinery': 'REVAP', 'points': '450', 'observations': ''
+    })
+    assert totals()[0] == (1150, 3)
+    assert_rollup_matches()
+
+    entry = Entry.query.filter_by(points=200).one()
+    client.post(f'/delete_entry/{entry.id}')
+    assert totals()[0] == (950, 2)
+    assert_rollup_matches()
+
+    client.post('/delete_all_entries')
+    assert totals() == ((0, 0), (0, 0))
+
+
+def test_empty_rollup_is_rebuilt(client, employee):
+    login(client, 'employee', employee.id)
+    register(client, '2026-10-01', 'REVAP', 500)
+    register(client, '2026-10-02', 'REVAP', 250)
+
+    # Tabela criada vazia (create_all sem backfill)
+    clear_rollup()
+    db.session.commit()
+    assert totals()[1] == (0, 0)
+
+    assert ensure_daily_rollup() == 2
+    assert_rollup_matches()
+    # Rollup preenchido: nada a fazer
+    assert ensure_daily_rollup() is None
+
+
+def test_rebuild_invalidates_cached_results(client, employee):
+    today = cycle_calendar.today().isoformat()
+    login(client, 'employee', employee.id)
+    register(client, today, 'REVAP', 500)
+
+    # Gráfico calculado (e guardado no cache) enquanto o rollup estava vazio
+    clear_rollup()
+    db.session.commit()
+    login(client, 'ceo', 'ceo_001', 'CEO')
+    assert sum(client.get('/api/weekly_data').get_json()['datasets'][0]['data']) == 0
+
+    assert ensure_daily_rollup() == 1
+    assert sum(client.get('/api/weekly_data').get_json()['datasets'][0]['data']) == 500
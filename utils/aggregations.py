@@ -0,0 +1,103 @@
+"""Agregações feitas no banco de dados.
+
+Cada função envia uma única consulta com GROUP BY sobre a tabela
+daily_rollup e devolve apenas a pequena matriz de resultados
+(funcionários × intervalos), em vez de carregar todo o histórico de
+registros para agrupar em Python.
+"""
+from datetime import timedelta
+from sqlalchemy import func, case, and_
+from models import db, DailyRollup
+from utils.calculations import rollup_day_range
+from utils.cycle_calendar import cycle_calendar
+
+
+def get_cycle_week_ranges():
+    """Retorna os intervalos (início, fim) das 5 semanas do ciclo atual"""
+    return cycle_calendar.week_ranges()
+
+
+def cycle_week_bucket(week_ranges):
+    """Expressão CASE que mapeia DailyRollup.day para o índice da semana (0 a 4)"""
+    whens = [
+        (and_(*rollup_day_range(start_date, end_date)), week_idx)
+        for week_idx, (start_date, end_date) in enumerate(week_ranges)
+    ]
+    return case(*whens, else_=None)
+
+
+def weekly_totals_by_employee(employee_ids=None, week_ranges=None):
+    """Soma os pontos por funcionário e semana do ciclo com um único GROUP BY.
+
+    Retorna {employee_id: [pontos_semana_1, ..., pontos_semana_5]} apenas para
+    funcionários com registros no ciclo.
+    """
+    week_ranges = week_ranges or get_cycle_week_ranges()
+    cycle_start = min(start for start, _ in week_ranges)
+    cycle_end = max(end for _, end in week_ranges)
+
+    # Subconsulta para que o GROUP BY use a coluna rotulada e não repita o CASE
+    bucketed = db.session.query(
+        DailyRollup.employee_id.label('employee_id'),
+        cycle_week_bucket(week_ranges).label('cycle_week'),
+        DailyRollup.points.label('points')
+    ).filter(*rollup_day_range(cycle_start, cycle_end))
+
+    if employee_ids is not None:
+        bucketed = bucketed.filter(DailyRollup.employee_id.in_(list(employee_ids)))
+
+    bucketed = bucketed.subquery()
+
+    rows = db.session.query(
+        bucketed.c.employee_id,
+        bucketed.c.cycle_week,
+        func.sum(bucketed.c.points)
+    ).group_by(bucketed.c.employee_id, bucketed.c.cycle_week).all()
+
+    totals = {}
+    for employee_id, week_idx, points in rows:
+        if week_idx is None:
+            continue
+        totals.setdefault(employee_id, [0] * len(week_ranges))[week_idx] += int(points or 0)
+    return totals
+
+
+def daily_totals_by_employee(start_date, end_date, employee_ids=None):
+    """Soma os pontos por funcionário e dia com um único GROUP BY.
+
+    Retorna {employee_id: {date: pontos}}.
+    """
+    query = db.session.query(
+        DailyRollup.employee_id,
+        DailyRollup.day,
+        func.sum(DailyRollup.points)
+    ).filter(*rollup_day_range(start_date, end_date))
+
+    if employee_ids is not None:
+        query = query.filter(DailyRollup.employee_id.in_(list(employee_ids)))
+
+    totals = {}
+    for employee_id, day_value, points in query.group_by(DailyRollup.employee_id, DailyRollup.day).all():
+        totals.setdefault(employee_id, {})[day_value] = int(points or 0)
+    return totals
+
+
+def build_daily_matrix(employee_ids, start_date, end_date):
+    """Monta a matriz densa funcionário × dia para o intervalo (inclusive).
+
+    Retorna (dias, {employee_id: [pontos_por_dia]}) com zeros nos dias sem registro.
+    """
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        days.append(current_date)
+        current_date += timedelta(days=1)
+
+    employee_ids = list(employee_ids)
+    totals = daily_totals_by_employee(start_date, end_date, employee_ids) if employee_ids else {}
+
+    matrix = {}
+    for employee_id in employee_ids:
+        employee_days = totals.get(employee_id, {})
+        matrix[employee_id] = [float(employee_days.get(day, 0)) for day in days]
+    return days, matrix
@@ -0,0 +1,366 @@
+"""Backends de armazenamento para o cache de resultados.
+
+- MemoryBackend: dicionário do próprio processo (padrão para testes/dev).
+- SQLiteBackend: arquivo SQLite em disco compartilhado por todos os workers
+  do gunicorn na mesma máquina, sem depender de Redis.
+
+Todos expõem a mesma interface: get/set/delete/clear, contadores
+atômicos (incr/get_counters), leases (acquire_lease/release_lease/
+lease_owner), size e stats. Ambos são limitados por número de entradas e
+por tamanho aproximado em bytes; ao ultrapassar o teto as entradas menos
+usadas recentemente (LRU) são descartadas. Os leases do single-flight
+ficam fora dos valores: não contam nos limites e nunca são descartados
+pelo LRU enquanto um cálculo está em andamento.
+"""
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Pasta instance/ do app (mesma usada pelo Flask); os caches em disco ficam nela, nunca no /tmp compartilhado
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance')
+DEFAULT_SQLITE_PATH = os.path.join(INSTANCE_DIR, 'result_cache', 'result_cache.sqlite3')
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+# Intervalo mínimo entre atualizações do último acesso no SQLite (evita uma escrita por leitura)
+TOUCH_INTERVAL = 30
+
+
+def ensure_private_directory(path):
+    """Cria o diretório de cache com permissão 0o700 e recusa diretórios inseguros.
+
+    O conteúdo dos caches é desserializado com pickle: um diretório de outro
+    usuário ou com escrita para grupo/outros permitiria plantar arquivos que
+    executariam código no worker.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        info = os.stat(path)
+        if info.st_uid != os.getuid() or info.st_mode & 0o022:
+            raise PermissionError(
+                f"Diretório de cache inseguro (de outro usuário ou gravável por outros): {path}"
+            )
+    return path
+
+
+def approximate_size(value):
+    """Tamanho aproximado em bytes de um objeto e de tudo que ele contém"""
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if hasattr(obj, 'memory_usage') and hasattr(obj, 'columns'):
+            # DataFrame do pandas: sys.getsizeof não enxerga os blocos de dados
+            total += int(obj.memory_usage(deep=True).sum())
+            continue
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+class MemoryBackend:
+    """Armazenamento em memória do processo (LRU limitado por entradas e bytes)"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._values = OrderedDict()  # chave -> (valor, expira_em, bytes), mais antigo primeiro
+        self._counters = {}
+        self._leases = {}  # chave -> (dono, expira_em)
+        self._bytes = 0
+        self._evictions = 0
+
+    def _pop(self, key):
+        item = self._values.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+        return item
+
+    def _alive(self, key, now):
+        item = self._values.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= now:
+            self._pop(key)
+            return None
+        self._values.move_to_end(key)
+        return item
+
+    def _put(self, key, value, timeout):
+        size = approximate_size(value)
+        self._pop(key)
+        if size > self.max_bytes:
+            # Valor maior que o teto: não guardar (evita esvaziar o cache inteiro)
+            return False
+        self._values[key] = (value, time.time() + timeout if timeout else None, size)
+        self._bytes += size
+        self._evict()
+        return True
+
+    def _evict(self):
+        """Descarta as entradas menos usadas até respeitar os limites"""
+        while self._values and (len(self._values) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, size) = self._values.popitem(last=False)
+            self._bytes -= size
+            self._evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            item = self._alive(key, time.time())
+            return item[0] if item else None
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._put(key, value, timeout)
+
+    def acquire_lease(self, key, owner, timeout):
+        """Obtém o lease se estiver livre (ou expirado); retorna True se obteve"""
+        with self._lock:
+            now = time.time()
+            lease = self._leases.get(key)
+            if lease is not None and lease[1] > now:
+                return False
+            self._leases[key] = (str(owner), now + timeout)
+            return True
+
+    def release_lease(self, key, owner):
+        """Libera o lease apenas se ainda pertencer a `owner`"""
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease[0] == str(owner):
+                del self._leases[key]
+
+    def lease_owner(self, key):
+        with self._lock:
+            lease = self._leases.get(key)
+            return lease[0] if lease is not None and lease[1] > time.time() else None
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._bytes = 0
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counters(self, keys):
+        return {key: self._counters.get(key, 0) for key in keys}
+
+    def size(self):
+        return len(self._values)
+
+    def stats(self):
+        return {
+            'entries': len(self._values),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'evictions': self._evictions,
+        }
+
+
+class SQLiteBackend:
+    """Armazenamento em arquivo SQLite compartilhado entre processos (LRU limitado)"""
+
+    name = 'sqlite'
+    EVICTIONS_KEY = 'backend:evictions'
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or DEFAULT_SQLITE_PATH
+        ensure_private_directory(os.path.dirname(os.path.abspath(self.path)))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        conn = self._connect()
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(cache_values)')}
+        if columns and not {'size', 'accessed'} <= columns:
+            # Arquivo de uma versão anterior: o conteúdo é descartável
+            conn.execute('DROP TABLE cache_values')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_values '
+            '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+            'size INTEGER NOT NULL, accessed REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_values_accessed ON cache_values (accessed)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_counters '
+            '(key TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+        )
+        # Leases em tabela própria: fora dos limites e do LRU de cache_values
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_leases '
+            '(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        # Após um fork (gunicorn --preload) a conexão herdada não pode ser reutilizada
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache_values WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] <= now:
+            self.delete(key)
+            return None
+        if now - row[2] > TOUCH_INTERVAL:
+            conn.execute('UPDATE cache_values SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def _row(self, key, value, timeout):
+        now = time.time()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return (key, blob, now + timeout if timeout else None, len(blob), now)
+
+    def set(self, key, value, timeout=None):
+        row = self._row(key, value, timeout)
+        if row[3] > self.max_bytes:
+            # Valor maior que o teto: não guardar (evita esvaziar o cache inteiro)
+            self.delete(key)
+            return
+        self._connect().execute(
+            'INSERT OR REPLACE INTO cache_values (key, value, expires, size, accessed) '
+            'VALUES (?, ?, ?, ?, ?)',
+            row
+        )
+        self._evict()
+
+    def acquire_lease(self, key, owner, timeout):
+        """Obtém o lease se estiver livre (ou expirado); retorna True se obteve"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('DELETE FROM cache_leases WHERE key = ? AND expires <= ?', (key, now))
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO cache_leases (key, owner, expires) VALUES (?, ?, ?)',
+            (key, str(owner), now + timeout)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key, owner):
+        """Libera o lease apenas se ainda pertencer a `owner`"""
+        self._connect().execute('DELETE FROM cache_leases WHERE key = ? AND owner = ?', (key, str(owner)))
+
+    def lease_owner(self, key):
+        row = self._connect().execute(
+            'SELECT owner FROM cache_leases WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _evict(self):
+        """Remove expirados e, acima dos limites, as entradas menos acessadas"""
+        conn = self._connect()
+        conn.execute('DELETE FROM cache_values WHERE expires <= ?', (time.time(),))
+        count, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_values'
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        removed = 0
+        for key, size in conn.execute(
+            'SELECT key, size FROM cache_values ORDER BY accessed'
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM cache_values WHERE key = ?', (key,))
+            count -= 1
+            total -= size
+            removed += 1
+        if removed:
+            conn.execute(
+                'INSERT INTO cache_counters (key, value) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = value + excluded.value',
+                (self.EVICTIONS_KEY, removed)
+            )
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache_values WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_values')
+
+    def incr(self, key):
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO cache_counters (key, value) VALUES (?, 1) '
+            'ON CONFLICT(key) DO UPDATE SET value = value + 1',
+            (key,)
+        )
+        return conn.execute('SELECT value FROM cache_counters WHERE key = ?', (key,)).fetchone()[0]
+
+    def get_counters(self, keys):
+        keys = list(keys)
+        placeholders = ','.join('?' for _ in keys)
+        rows = self._connect().execute(
+            f'SELECT key, value FROM cache_counters WHERE key IN ({placeholders})', keys
+        ).fetchall()
+        counters = dict(rows)
+        return {key: counters.get(key, 0) for key in keys}
+
+    def size(self):
+        return self._connect().execute('SELECT COUNT(*) FROM cache_values').fetchone()[0]
+
+    def stats(self):
+        count, total = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_values'
+        ).fetchone()
+        return {
+            'entries': count,
+            'bytes': total,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'evictions': self.get_counters([self.EVICTIONS_KEY])[self.EVICTIONS_KEY],
+        }
+
+
+BACKENDS = {
+    MemoryBackend.name: MemoryBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+def create_backend(name, path=None, max_entries=None, max_bytes=None):
+    """Instancia o backend configurado ('memory' ou 'sqlite')"""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend de cache desconhecido: {name}")
+    limits = {
+        'max_entries': max_entries or DEFAULT_MAX_ENTRIES,
+        'max_bytes': max_bytes or DEFAULT_MAX_BYTES,
+    }
+    if backend_class is SQLiteBackend:
+        return backend_class(path=path, **limits)
+    return backend_class(**limits)
@@ -1,42 +1,81 @@
-from models import db, Employee, Entry
+from models import db, Employee, Entry, DailyRollup
 from utils.helpers import timezone
-from sqlalchemy import func
+from utils.cycle_calendar import cycle_calendar, to_date
+from utils.result_cache import result_cache, daily_cache_key
+from sqlalchemy import func, case, and_
 from flask import current_app
-from datetime import datetime, timedelta  # Adicionar esta importação
+from datetime import datetime, date, timedelta  # Adicionar esta importação
+
+def entry_date_range(start_date, end_date):
+    """Condições de filtro para registros entre duas datas (inclusive) usando a coluna indexada date_time"""
+    if not isinstance(start_date, date):
+        start_date = datetime.strptime(str(start_date)[:10], '%Y-%m-%d')
+    if not isinstance(end_date, date):
+        end_date = datetime.strptime(str(end_date)[:10], '%Y-%m-%d')
+    start = datetime(start_date.year, start_date.month, start_date.day)
+    end = datetime(end_date.year, end_date.month, end_date.day) + timedelta(days=1)
+    return Entry.date_time >= start, Entry.date_time < end
+
+def entry_rows_query(*filters):
+    """Consulta de leitura que projeta apenas as colunas usadas nas listagens.
+
+    Retorna tuplas leves (id, date, date_time, refinery, points, observations,
+    employee_id, employee_name) com o nome vindo do JOIN, sem hidratar objetos
+    Entry nem disparar o carregamento preguiçoso de `entry.employee` por linha.
+    """
+    return db.session.query(
+        Entry.id,
+        Entry.date,
+        Entry.date_time,
+        Entry.refinery,
+        Entry.points,
+        Entry.observations,
+        Entry.employee_id,
+        Employee.real_name.label('employee_name')
+    ).join(Employee, Employee.id == Entry.employee_id).filter(*filters)
+
+def rollup_day_range(start_date, end_date):
+    """Condições de filtro sobre daily_rollup entre duas datas (inclusive)"""
+    return DailyRollup.day >= to_date(start_date), DailyRollup.day <= to_date(end_date)
+
+def approximate_entry_count(employee_id=None, start_date=None, end_date=None):
+    """Total aproximado de registros somando as contagens diárias do daily_rollup.
+
+    Custa O(dias) em vez de O(registros); não inclui registros sem data válida.
+    """
+    query = db.session.query(func.sum(DailyRollup.entries))
+    if employee_id:
+        query = query.filter(DailyRollup.employee_id == employee_id)
+    if start_date and end_date:
+        query = query.filter(*rollup_day_range(start_date, end_date))
+    return int(query.scalar() or 0)
+
+def sum_points_by_employee_name(start_date, end_date, employee_id=None):
+    """Soma os pontos do rollup por nome de funcionário no intervalo"""
+    query = db.session.query(
+        Employee.real_name,
+        func.sum(DailyRollup.points)
+    ).join(
+        DailyRollup, DailyRollup.employee_id == Employee.id
+    ).filter(*rollup_day_range(start_date, end_date))
+    
+    if employee_id:
+        query = query.filter(DailyRollup.employee_id == employee_id)
+    
+    rows = query.group_by(Employee.real_name).all()
+    return {name: int(points or 0) for name, points in rows}
 
 def get_week_dates(week_str):
     """Retorna o intervalo de datas da semana do ciclo (26 ao 25)"""
     try:
         if week_str.isdigit():
             week_num = int(week_str)
-            today = datetime.now()
             
-            # Descobrir início do ciclo
-            if today.day >= 26:
-                cycle_start = today.replace(day=26)
+            if 1 <= week_num <= 5:
+                week_start, week_end = cycle_calendar.week_range(week_num)
             else:
-                if today.month == 1:
-                    cycle_start = today.replace(year=today.year-1, month=12, day=26)
-                else:
-                    cycle_start = today.replace(month=today.month-1, day=26)
-            
-            # Para semanas 1 a 4: 7 dias cada (com ajuste especial para semana 1)
-            if week_num == 1:
-                week_start = cycle_start
-                week_end = cycle_start + timedelta(days=7)  # 8 dias total (26 a 02)
-            elif 2 <= week_num <= 4:
-                week_start = cycle_start + timedelta(days=(week_num-1)*7 + 1)  # +1 para ajustar
+                week_start = cycle_calendar.cycle_range()[0]
                 week_end = week_start + timedelta(days=6)
-            elif week_num == 5:
-                week_start = cycle_start + timedelta(days=28)
-                # Fim: dia 25 do mês seguinte ao ciclo_start
-                if cycle_start.month == 12:
-                    week_end = cycle_start.replace(year=cycle_start.year+1, month=1, day=25)
-                else:
-                    week_end = cycle_start.replace(month=cycle_start.month+1, day=25)
-            else:
-                week_start = cycle_start
-                week_end = cycle_start + timedelta(days=6)
             
             result = week_start.strftime('%Y-%m-%d'), week_end.strftime('%Y-%m-%d')
             return result
@@ -53,8 +92,7 @@ def get_week_dates(week_str):
         return start_of_week.strftime('%Y-%m-%d'), end_of_week.strftime('%Y-%m-%d')
 
 def get_current_week():
-    today = datetime.now(timezone)
-    return get_week_from_date(today.strftime('%Y-%m-%d %H:%M:%S'))
+    return cycle_calendar.week_of(cycle_calendar.today())
 
 def get_week_from_date(date_str):
     """
@@ -62,34 +100,7 @@ def get_week_from_date(date_str):
     Retorna a semana atual (1 a 5).
     """
     try:
-        # Aceitar tanto formato com hora quanto sem hora
-        if ' ' in date_str:
-            date = datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-        else:
-            date = datetime.strptime(date_str, '%Y-%m-%d')
-
-        # Define o início do ciclo (dia 26 do mês atual ou anterior)
-        if date.day >= 26:
-            cycle_start = date.replace(day=26)
-        else:
-            # Retrocede para o dia 26 do mês anterior
-            if date.month == 1:
-                cycle_start = date.replace(year=date.year-1, month=12, day=26)
-            else:
-                cycle_start = date.replace(month=date.month-1, day=26)
-
-        # Calcula a diferença em dias
-        delta_days = (date - cycle_start).days
-
-        # Semana = (dias de diferença // 7) + 1
-        week_number = (delta_days // 7) + 1
-
-        # Se o dia cair exatamente no múltiplo de 7 (ex.: 7, 14, 21...) **e** não for o primeiro dia do ciclo,
-        # consideramos ainda a semana anterior (mantém 26-02 como Semana 1, 03-09 Semana 2, etc.)
-        if delta_days != 0 and delta_days % 7 == 0:
-            week_number -= 1
-
-        return min(week_number, 5)  # Limita a 5 semanas
+        return cycle_calendar.week_of(date_str)
     except Exception as e:
         current_app.logger.error(f"Erro ao calcular semana: {str(e)}")
         return 1
@@ -108,23 +119,8 @@ def calculate_weekly_progress(week, employee_id=None):
         start_date, end_date = get_week_dates(str(week))  # CORREÇÃO: Converter para string
         current_app.logger.info(f"Calculando progresso semanal - Semana {week}: {start_date} até {end_date}")
         
-        # CORREÇÃO: Usar func.date() para comparar apenas a parte da data
-        query = Entry.query.filter(
-            func.date(Entry.date) >= start_date,
-            func.date(Entry.date) <= end_date
-        )
-        
-        if employee_id:
-            query = query.filter(Entry.employee_id == employee_id)
-        
-        entries = query.all()
-        current_app.logger.info(f"Entradas encontradas: {len(entries)}")
-
-        # Agrupar pontos por funcionário
-        employee_totals = {}
-        for entry in entries:
-            emp_name = entry.employee.real_name
-            employee_totals[emp_name] = employee_totals.get(emp_name, 0) + entry.points
+        # Agrupar pontos por funcionário (somando o rollup diário)
+        employee_totals = sum_points_by_employee_name(start_date, end_date, employee_id)
 
         current_app.logger.info(f"Totais semanais calculados: {employee_totals}")
         return employee_totals
@@ -132,6 +128,19 @@ def calculate_weekly_progress(week, employee_id=None):
         current_app.logger.error(f"Erro ao calcular progresso semanal: {str(e)}")
         return {}
 
+def monthly_cycle_range(month, year):
+    """Intervalo (início, fim) em 'YYYY-MM-DD' do ciclo 26-25 que termina no mês informado"""
+    # Sistema de ciclos: 26 do mês anterior a 25 do mês atual
+    # Mas se estamos após o dia 25, incluir também o período atual
+    today = cycle_calendar.today()
+    start_date, end_date = cycle_calendar.cycle_range((year, month))
+    
+    # Se estamos após o dia 25, estender até hoje
+    if today.day > 25:
+        end_date = today
+    
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
 # Função calculate_monthly_progress (linha ~160)
 def calculate_monthly_progress(employee_id=None, month=None, year=None):
     """Calcula o progresso mensal usando ciclos de 26 a 25"""
@@ -141,42 +150,12 @@ def calculate_monthly_progress(employee_id=None, month=None, year=None):
             month = month or now.month
             year = year or now.year
         
-        # Sistema de ciclos: 26 do mês anterior a 25 do mês atual
-        # Mas se estamos após o dia 25, incluir também o período atual
-        current_day = datetime.now().day
-        
-        if month == 1:
-            start_date = f"{year-1}-12-26"
-        else:
-            start_date = f"{year}-{month-1:02d}-26"
-        
-        # Se estamos após o dia 25, estender até hoje
-        if current_day > 25:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        else:
-            end_date = f"{year}-{month:02d}-25"
+        start_date, end_date = monthly_cycle_range(month, year)
         
         current_app.logger.info(f"Calculando progresso mensal de {start_date} até {end_date}")
         
-        # CORREÇÃO: Usar func.date() para comparar apenas a parte da data
-        query = Entry.query.filter(
-            func.date(Entry.date) >= start_date,
-            func.date(Entry.date) <= end_date
-        )
-        
-        if employee_id:
-            query = query.filter(Entry.employee_id == employee_id)
-        
-        entries = query.all()
-        current_app.logger.info(f"Entradas encontradas para cálculo mensal: {len(entries)}")
-        
-        # Calcular totais por funcionário
-        employee_totals = {}
-        for entry in entries:
-            emp_name = entry.employee.real_name
-            if emp_name not in employee_totals:
-                employee_totals[emp_name] = 0
-            employee_totals[emp_name] += entry.points
+        # Calcular totais por funcionário (somando o rollup diário)
+        employee_totals = sum_points_by_employee_name(start_date, end_date, employee_id)
         
         current_app.logger.info(f"Totais por funcionário: {employee_totals}")
         return employee_totals
@@ -184,104 +163,118 @@ def calculate_monthly_progress(employee_id=None, month=None, year=None):
         current_app.logger.error(f"Erro ao calcular progresso mensal: {str(e)}")
         return {}
 
+def points_by_employee_for_ranges(*date_ranges):
+    """Pontos de cada funcionário em vários intervalos com uma única consulta agrupada.
+
+    Retorna [(funcionário, [pontos_intervalo_1, pontos_intervalo_2, ...])] para
+    todos os funcionários (inclusive sem registros), em ordem de id.
+    """
+    first_day = min(to_date(start) for start, _ in date_ranges)
+    last_day = max(to_date(end) for _, end in date_ranges)
+    
+    sums = [
+        func.sum(case((and_(*rollup_day_range(start, end)), DailyRollup.points), else_=0))
+        for start, end in date_ranges
+    ]
+    rows = db.session.query(Employee, *sums).outerjoin(
+        DailyRollup, and_(
+            DailyRollup.employee_id == Employee.id,
+            *rollup_day_range(first_day, last_day)
+        )
+    ).group_by(Employee.id).order_by(Employee.id).all()
+    
+    return [
+        (row[0], [int(points or 0) for points in row[1:]])
+        for row in rows
+    ]
+
 def calculate_executive_kpis():
     """Calcula KPIs executivos avançados para o dashboard do CEO"""
     try:
-        employees = Employee.query.all()
-        now = datetime.now()
-        
-        # KPIs de Performance da Equipe
-        total_team_points = 0
-        employees_meeting_goals = 0
-        total_employees = len(employees)
+        # Reaproveitado enquanto nenhum registro mudar (invalidação por geração)
+        return result_cache.get_or_compute(daily_cache_key('executive_kpis'), compute_executive_kpis)
+    
+    except Exception as e:
+        current_app.logger.error(f"Erro ao calcular KPIs executivos: {str(e)}")
+        return {}
+
+def compute_executive_kpis():
+    """Calcula os KPIs com uma consulta agrupada e uma única passada pelos funcionários"""
+    # Semana atual e anterior (na semana 1 a comparação é com ela mesma)
+    current_week = get_current_week()
+    current_week_str = str(current_week) if current_week is not None else "1"
+    previous_week = str(int(current_week_str) - 1) if current_week_str.isdigit() and int(current_week_str) > 1 else "1"
+    
+    current_range = get_week_dates(current_week_str)
+    try:
+        previous_range = get_week_dates(previous_week)
+    except Exception:
+        # Se houver erro ao obter datas, usar valores padrão
+        previous_range = (
+            (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d'),
+            datetime.now().strftime('%Y-%m-%d')
+        )
+    
+    rows = points_by_employee_for_ranges(current_range, previous_range)
+    
+    # KPIs de Performance da Equipe
+    total_team_points = 0
+    previous_week_points = 0
+    employees_meeting_goals = 0
+    total_employees = len(rows)
+    
+    # KPIs de Tendências
+    employees_at_risk = []
+    top_performers = []
+    
+    for employee, (weekly_points, previous_points) in rows:
+        total_team_points += weekly_points
+        previous_week_points += previous_points
         
-        # KPIs de Tendências
-        employees_at_risk = []
-        top_performers = []
+        # Verificar se está atingindo a meta (70% da meta semanal)
+        weekly_goal = employee.weekly_goal or 2375
+        goal_percentage = (weekly_points / weekly_goal) * 100 if weekly_goal > 0 else 0
         
-        # Calcular métricas para cada funcionário
-        for employee in employees:
-            # Pontos da semana atual
-            current_week = get_current_week()
-            start_date, end_date = get_week_dates(str(current_week))
-            
-            # Na função calculate_executive_kpis (linha ~210)
-            weekly_points = db.session.query(func.sum(Entry.points)).filter(
-                Entry.employee_id == employee.id,
-                func.date(Entry.date) >= start_date,
-                func.date(Entry.date) <= end_date
-            ).scalar() or 0
-            
-            total_team_points += weekly_points
-            
-            # Verificar se está atingindo a meta (70% da meta semanal)
-            weekly_goal = employee.weekly_goal or 2375
-            goal_percentage = (weekly_points / weekly_goal) * 100 if weekly_goal > 0 else 0
-            
-            if goal_percentage >= 70:
-                employees_meeting_goals += 1
-            
-            # Classificar funcionários
-            if goal_percentage < 70:
-                employees_at_risk.append({
-                    'name': employee.real_name,
-                    'percentage': goal_percentage,
-                    'points': weekly_points
-                })
-            elif goal_percentage >= 110:
+        # Classificar funcionários
+        if goal_percentage >= 70:
+            employees_meeting_goals += 1
+            if goal_percentage >= 110:
                 top_performers.append({
                     'name': employee.real_name,
                     'percentage': goal_percentage,
                     'points': weekly_points
                 })
-        
-        # Calcular KPIs comparativos (semana anterior)
-        current_week_str = str(current_week) if current_week is not None else "1"
-        previous_week = str(int(current_week_str) - 1) if current_week_str.isdigit() and int(current_week_str) > 1 else "1"
-        
-        try:
-            prev_start_date, prev_end_date = get_week_dates(previous_week)
-        except Exception:
-            # Se houver erro ao obter datas, usar valores padrão
-            prev_start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            prev_end_date = datetime.now().strftime('%Y-%m-%d')
-        
-        # Na função calculate_executive_kpis (linha ~250)
-        previous_week_points = db.session.query(func.sum(Entry.points)).filter(
-            func.date(Entry.date) >= prev_start_date,
-            func.date(Entry.date) <= prev_end_date
-        ).scalar() or 0
-        
-        # Calcular variação percentual
-        week_variation = 0
-        if previous_week_points > 0:
-            week_variation = ((total_team_points - previous_week_points) / previous_week_points) * 100
-        
-        # KPIs finais
-        kpis = {
-            'team_performance': {
-                'total_points': total_team_points,
-                'avg_points_per_employee': total_team_points / total_employees if total_employees > 0 else 0,
-                'goal_achievement_rate': (employees_meeting_goals / total_employees) * 100 if total_employees > 0 else 0,
-                'employees_meeting_goals': employees_meeting_goals,
-                'total_employees': total_employees
-            },
-            'trends_and_alerts': {
-                'employees_at_risk': employees_at_risk[:3],  # Top 3 em risco
-                'top_performers': sorted(top_performers, key=lambda x: x['percentage'], reverse=True)[:3],  # Top 3 performers
-                'critical_alerts_count': len(employees_at_risk),
-                'week_variation': week_variation
-            },
-            'comparative': {
-                'current_week_points': total_team_points,
-                'previous_week_points': previous_week_points,
-                'week_variation_percentage': week_variation,
-                'trend_direction': 'up' if week_variation > 0 else 'down' if week_variation < 0 else 'stable'
-            }
+        else:
+            employees_at_risk.append({
+                'name': employee.real_name,
+                'percentage': goal_percentage,
+                'points': weekly_points
+            })
+    
+    # Calcular variação percentual
+    week_variation = 0
+    if previous_week_points > 0:
+        week_variation = ((total_team_points - previous_week_points) / previous_week_points) * 100
+    
+    # KPIs finais
+    return {
+        'team_performance': {
+            'total_points': total_team_points,
+            'avg_points_per_employee': total_team_points / total_employees if total_employees > 0 else 0,
+            'goal_achievement_rate': (employees_meeting_goals / total_employees) * 100 if total_employees > 0 else 0,
+            'employees_meeting_goals': employees_meeting_goals,
+            'total_employees': total_employees
+        },
+        'trends_and_alerts': {
+            'employees_at_risk': employees_at_risk[:3],  # Top 3 em risco
+            'top_performers': sorted(top_performers, key=lambda x: x['percentage'], reverse=True)[:3],  # Top 3 performers
+            'critical_alerts_count': len(employees_at_risk),
+            'week_variation': week_variation
+        },
+        'comparative': {
+            'current_week_points': total_team_points,
+            'previous_week_points': previous_week_points,
+            'week_variation_percentage': week_variation,
+            'trend_direction': 'up' if week_variation > 0 else 'down' if week_variation < 0 else 'stable'
         }
-        
-        return kpis
-        
-    except Exception as e:
-        current_app.logger.error(f"Erro ao calcular KPIs executivos: {str(e)}")
-        return {}
\ No newline at end of file
+    }
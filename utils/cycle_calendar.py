@@ -0,0 +1,165 @@
+"""Calendário dos ciclos da empresa (dia 26 de um mês ao dia 25 do seguinte).
+
+Todas as regras de ciclo/semana ficam aqui. As fronteiras são pré-calculadas
+para um intervalo de anos e guardadas em tabelas de consulta, de modo que
+data → (ciclo, semana) e (ciclo, semana) → intervalo são consultas O(1).
+
+Um ciclo é identificado pela tupla (ano, mês) do mês em que ele TERMINA:
+o ciclo (2025, 4) vai de 26/03/2025 até 25/04/2025 ("Abril").
+
+Semanas do ciclo (deslocamento em dias a partir do dia 26):
+    1: 0 a 7 (8 dias, 26 ao 02)
+    2: 8 a 14
+    3: 15 a 21
+    4: 22 a 28
+    5: 29 até o dia 25
+Semanas que passariam do fim do ciclo são cortadas no dia 25; em ciclos
+curtos (fevereiro) a semana 5 fica vazia (início depois do fim).
+"""
+import threading
+from datetime import date, datetime, timedelta
+from utils.helpers import timezone
+
+CYCLE_START_DAY = 26
+WEEKS_PER_CYCLE = 5
+# Deslocamento (em dias) do início de cada semana em relação ao dia 26
+WEEK_START_OFFSETS = (0, 8, 15, 22, 29)
+
+
+def to_date(value):
+    """Converte date/datetime/Timestamp/string 'YYYY-MM-DD[ HH:MM:SS]' para date"""
+    if value is None:
+        return None
+    if isinstance(value, datetime) or hasattr(value, 'to_pydatetime'):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+def cycle_bounds(cycle):
+    """Retorna (início, fim) do ciclo (ano, mês) sem usar a tabela"""
+    year, month = cycle
+    if month == 1:
+        start = date(year - 1, 12, CYCLE_START_DAY)
+    else:
+        start = date(year, month - 1, CYCLE_START_DAY)
+    return start, date(year, month, CYCLE_START_DAY - 1)
+
+
+class CycleCalendar:
+    """Tabelas de consulta pré-calculadas para ciclos e semanas"""
+
+    def __init__(self, years_before=2, years_after=2):
+        self._lock = threading.Lock()
+        self._built_years = set()
+        self._day_index = {}    # date -> ((ano, mês), semana)
+        self._cycle_ranges = {}  # (ano, mês) -> (início, fim)
+        self._week_ranges = {}  # ((ano, mês), semana) -> (início, fim)
+        self._today = None
+        self._today_cycle = None
+
+        current_year = datetime.now(timezone).year
+        for year in range(current_year - years_before, current_year + years_after + 1):
+            self._build_year(year)
+
+    def _build_year(self, year):
+        """Pré-calcula os 12 ciclos que terminam no ano informado"""
+        with self._lock:
+            if year in self._built_years:
+                return
+            for month in range(1, 13):
+                cycle = (year, month)
+                start, end = cycle_bounds(cycle)
+                self._cycle_ranges[cycle] = (start, end)
+
+                for week_idx, offset in enumerate(WEEK_START_OFFSETS):
+                    week = week_idx + 1
+                    week_start = start + timedelta(days=offset)
+                    if week < WEEKS_PER_CYCLE:
+                        next_offset = WEEK_START_OFFSETS[week_idx + 1]
+                        week_end = min(start + timedelta(days=next_offset - 1), end)
+                    else:
+                        week_end = end
+                    week_start = min(week_start, end + timedelta(days=1))
+                    self._week_ranges[(cycle, week)] = (week_start, week_end)
+
+                    day = week_start
+                    while day <= week_end:
+                        self._day_index[day] = (cycle, week)
+                        day += timedelta(days=1)
+            self._built_years.add(year)
+
+    @staticmethod
+    def _cycle_year_of(day):
+        """Ano do ciclo ao qual o dia pertence (26/12 já é do ano seguinte)"""
+        if day.month == 12 and day.day >= CYCLE_START_DAY:
+            return day.year + 1
+        return day.year
+
+    # ------------------------------------------------------------------ datas
+
+    def today(self):
+        """Data de hoje no fuso da empresa"""
+        return datetime.now(timezone).date()
+
+    def current_cycle(self):
+        """Ciclo que contém o dia de hoje (memoizado por dia)"""
+        today = self.today()
+        if today != self._today:
+            self._today_cycle = self.cycle_of(today)
+            self._today = today
+        return self._today_cycle
+
+    def locate(self, value):
+        """Retorna ((ano, mês), semana) da data informada"""
+        day = to_date(value)
+        located = self._day_index.get(day)
+        if located is None:
+            self._build_year(self._cycle_year_of(day))
+            located = self._day_index[day]
+        return located
+
+    def cycle_of(self, value):
+        """Ciclo (ano, mês) ao qual a data pertence"""
+        return self.locate(value)[0]
+
+    def week_of(self, value):
+        """Semana do ciclo (1 a 5) à qual a data pertence"""
+        return self.locate(value)[1]
+
+    def month_key(self, value):
+        """Mês da empresa no formato 'MM/YYYY' (ex.: 26/03 a 25/04 → '04/YYYY')"""
+        year, month = self.cycle_of(value)
+        return f"{month:02d}/{year}"
+
+    # ------------------------------------------------------------- intervalos
+
+    def cycle_range(self, cycle=None):
+        """Retorna (início, fim) do ciclo; padrão = ciclo atual"""
+        cycle = cycle or self.current_cycle()
+        bounds = self._cycle_ranges.get(cycle)
+        if bounds is None:
+            self._build_year(cycle[0])
+            bounds = self._cycle_ranges[cycle]
+        return bounds
+
+    def week_range(self, week, cycle=None):
+        """Retorna (início, fim) da semana (1 a 5) do ciclo; padrão = ciclo atual"""
+        cycle = cycle or self.current_cycle()
+        key = (cycle, int(week))
+        bounds = self._week_ranges.get(key)
+        if bounds is None:
+            if not 1 <= key[1] <= WEEKS_PER_CYCLE:
+                raise ValueError(f"Semana inválida: {week}")
+            self._build_year(cycle[0])
+            bounds = self._week_ranges[key]
+        return bounds
+
+    def week_ranges(self, cycle=None):
+        """Intervalos das 5 semanas do ciclo, em ordem"""
+        return [self.week_range(week, cycle) for week in range(1, WEEKS_PER_CYCLE + 1)]
+
+
+# Instância compartilhada por toda a aplicação
+cycle_calendar = CycleCalendar()
@@ -0,0 +1,248 @@
+"""Carregadores consolidados dos dashboards.
+
+Reúnem em poucas consultas fixas (independentes do número de funcionários)
+tudo o que uma página precisa, inclusive os dados dos gráficos, que são
+embutidos no HTML em vez de buscados depois via /api/*_data. Os gráficos
+usam as mesmas chaves do result_cache que os endpoints da API, então
+página e API compartilham o mesmo valor calculado.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import not_, or_
+
+from models import Entry
+
+from utils.aggregations import weekly_totals_by_employee
+from utils.calculations import (
+    calculate_executive_kpis,
+    get_week_dates,
+    monthly_cycle_range,
+    points_by_employee_for_ranges
+)
+from utils.data_processing import (
+    get_weekly_progress_data,
+    get_monthly_evolution_data,
+    get_daily_data,
+    get_employee_color
+)
+from utils.cycle_calendar import cycle_calendar, to_date
+from utils.helpers import timezone
+from utils.result_cache import result_cache, daily_cache_key
+
+# Quantidade de registros no histórico do dashboard do funcionário
+HISTORY_SIZE = 50
+
+
+def load_team_chart_data(employees):
+    """Dados dos três gráficos da equipe (semanal, mensal e diário)"""
+    # Semanal e mensal usam os mesmos totais por semana: consultar no máximo uma vez
+    team_weekly_totals = {}
+
+    def weekly_totals():
+        if 'value' not in team_weekly_totals:
+            team_weekly_totals['value'] = weekly_totals_by_employee()
+        return team_weekly_totals['value']
+
+    return {
+        'weekly': result_cache.get_or_compute(
+            daily_cache_key('weekly_data'),
+            lambda: get_weekly_progress_data(employees, weekly_totals())
+        ),
+        'monthly': result_cache.get_or_compute(
+            daily_cache_key('monthly_data'),
+            lambda: get_monthly_evolution_data(employees=employees, weekly_totals=weekly_totals())
+        ),
+        'daily': result_cache.get_or_compute(
+            daily_cache_key('daily_data'),
+            lambda: get_daily_data(employees=employees)
+        ),
+    }
+
+
+def load_ceo_dashboard(selected_week, include_charts=True):
+    """Tudo o que o dashboard do CEO precisa para renderizar"""
+    now = datetime.now(timezone)
+    week_range = get_week_dates(str(selected_week))
+    month_range = monthly_cycle_range(now.month, now.year)
+
+    # Funcionários + pontos da semana selecionada e do ciclo mensal em uma consulta
+    rows = points_by_employee_for_ranges(week_range, month_range)
+    employees = [employee for employee, _ in rows]
+
+    # Estrutura consolidada por funcionário (chaveada pelo nome, como no template)
+    employee_totals = {}
+    weekly_progress = {}
+    monthly_progress = {}
+    for employee, (weekly_points, monthly_points) in rows:
+        name = employee.real_name
+        weekly_progress[name] = weekly_progress.get(name, 0) + weekly_points
+        monthly_progress[name] = monthly_progress.get(name, 0) + monthly_points
+
+    for employee in employees:
+        name = employee.real_name
+        weekly_points = weekly_progress[name]
+        weekly_goal = employee.weekly_goal or 1
+        monthly_goal = employee.monthly_goal or 1
+        # Porcentagem de progresso semanal
+        percentage = (weekly_points / weekly_goal) * 100 if weekly_goal else 0
+        # Status
+        if percentage >= 100:
+            status = 'success'
+        elif percentage >= 50:
+            status = 'warning'
+        else:
+            status = 'danger'
+        employee_totals[name] = {
+            'weekly_points': weekly_points,
+            'weekly_goal': weekly_goal,
+            'monthly_points': monthly_progress[name],
+            'monthly_goal': monthly_goal,
+            'status': status
+        }
+
+    # Média de porcentagem da equipe
+    if employee_totals:
+        team_average_percentage = sum(
+            (v['weekly_points'] / v['weekly_goal']) * 100 if v['weekly_goal'] else 0
+            for v in employee_totals.values()
+        ) / len(employee_totals)
+    else:
+        team_average_percentage = 0
+
+    chart_data = None
+    if include_charts:
+        try:
+            chart_data = load_team_chart_data(employees)
+        except Exception as e:
+            # Sem dados embutidos a página volta a buscar via /api/*_data
+            current_app.logger.error(f"Erro ao carregar dados dos gráficos: {str(e)}")
+
+    return {
+        'employees': employees,
+        'employee_totals': employee_totals,
+        'total_points': sum(weekly_progress.values()),
+        'team_average_percentage': team_average_percentage,
+        'monthly_team_total': sum(monthly_progress.values()),
+        'kpis': calculate_executive_kpis(),
+        'chart_data': chart_data,
+    }
+
+
+def load_employee_entries(employee_id, since=None, history_size=HISTORY_SIZE):
+    """Registros do funcionário desde `since` (mais recentes primeiro), em uma consulta.
+
+    Se a janela tiver menos de `history_size` registros, completa o histórico
+    com os mais antigos em uma segunda consulta limitada.
+    """
+    query = Entry.query.filter(Entry.employee_id == employee_id)
+    if since is None:
+        return query.order_by(Entry.date.desc()).all()
+
+    window_filter = or_(Entry.date_time >= datetime(since.year, since.month, since.day), Entry.date_time.is_(None))
+    entries = query.filter(window_filter).order_by(Entry.date.desc()).all()
+    if len(entries) < history_size:
+        entries += query.filter(not_(window_filter)).order_by(
+            Entry.date.desc()
+        ).limit(history_size - len(entries)).all()
+    return entries
+
+
+def load_employee_dashboard(employee, selected_week):
+    """Tudo o que o dashboard do funcionário precisa, derivado dos registros dele.
+
+    Os registros do funcionário são buscados uma vez (desde o início do menor
+    intervalo usado na página) e semana, mês, dia, histórico e gráficos são
+    calculados em memória: o custo é O(registros do funcionário).
+    """
+    selected_week = str(selected_week)
+    now = datetime.now(timezone)
+    today = now.date()
+    cycle_start = cycle_calendar.cycle_range()[0]
+    week_ranges = cycle_calendar.week_ranges()
+
+    week_start, week_end = (to_date(value) for value in get_week_dates(selected_week))
+    month_start, month_end = (to_date(value) for value in monthly_cycle_range(now.month, now.year))
+
+    # "Todas" (semana vazia) lista todos os registros; senão basta a janela usada pela página
+    show_all = not selected_week.strip()
+    since = None if show_all else min(week_start, month_start, cycle_start, week_ranges[0][0], today)
+    entries = load_employee_entries(employee.id, since)
+
+    weekly_points = 0
+    monthly_points = 0
+    daily_points = 0
+    week_entries = []
+    points_by_week = [0] * len(week_ranges)
+    points_by_day = {}
+    for entry in entries:
+        if entry.date_time is None:
+            if show_all:
+                week_entries.append(entry)
+            continue
+        day = entry.date_time.date()
+        points = entry.points or 0
+
+        if week_start <= day <= week_end:
+            weekly_points += points
+            week_entries.append(entry)
+        elif show_all:
+            week_entries.append(entry)
+        if month_start <= day <= month_end:
+            monthly_points += points
+        if day == today:
+            daily_points += points
+        for index, (start, end) in enumerate(week_ranges):
+            if start <= day <= end:
+                points_by_week[index] += points
+                break
+        if cycle_start <= day <= today:
+            points_by_day[day] = points_by_day.get(day, 0) + points
+
+    daily_goal = employee.daily_goal or 1
+    weekly_goal = employee.weekly_goal or 1
+    monthly_goal = employee.monthly_goal or 1
+
+    week_labels = [f"Semana {i}" for i in range(1, len(week_ranges) + 1)]
+
+    # Gráfico diário no mesmo formato de get_daily_data (ciclo atual até hoje)
+    days = []
+    day = cycle_start
+    while day <= today:
+        days.append(day)
+        day += timedelta(days=1)
+    colors = get_employee_color(employee.real_name)
+    daily_datasets = []
+    if employee.real_name:
+        daily_datasets.append({
+            'label': str(employee.real_name),
+            'data': [float(points_by_day.get(day, 0)) for day in days],
+            'borderColor': colors['border'],
+            'backgroundColor': colors['bg'],
+            'tension': 0.4,
+            'fill': False
+        })
+
+    return {
+        'daily_points': daily_points,
+        'daily_percentage': (daily_points / daily_goal) * 100 if daily_goal else 0,
+        'weekly_points': weekly_points,
+        'weekly_percentage': (weekly_points / weekly_goal) * 100 if weekly_goal else 0,
+        'monthly_points': monthly_points,
+        'monthly_percentage': (monthly_points / monthly_goal) * 100 if monthly_goal else 0,
+        'entries': week_entries,
+        'all_entries': entries[:HISTORY_SIZE],
+        'weekly_data': {
+            'labels': week_labels,
+            'points': points_by_week
+        },
+        'monthly_data': {
+            'labels': week_labels,
+            'points': points_by_week,
+            'goals': [employee.weekly_goal] * len(week_ranges) if employee.weekly_goal else [0] * len(week_ranges)
+        },
+        'daily_data': {
+            'labels': [day.strftime('%d/%m') for day in days],
+            'datasets': daily_datasets
+        },
+    }
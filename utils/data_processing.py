@@ -1,271 +1,156 @@
-from datetime import datetime, timedelta
-from sqlalchemy import func
-from models import db, Employee, Entry
-from utils.calculations import get_week_dates, get_current_week
+from models import db, Employee
+from utils.calculations import get_current_week
+from utils.cycle_calendar import cycle_calendar
+from utils.aggregations import weekly_totals_by_employee, build_daily_matrix
 from flask import current_app
 
-def get_weekly_progress_data():
-    """OTIMIZADO: Busca dados semanais com consulta única"""
-    try:
-        current_app.logger.info("Iniciando busca de dados semanais otimizada")
-        
-        # Buscar todos os funcionários de uma vez
+# Os dados dos gráficos vão para o result_cache: as funções abaixo deixam as
+# exceções propagarem para que uma falha não seja guardada como gráfico vazio
+# (a estrutura vazia de fallback fica nas rotas)
+
+def get_weekly_progress_data(employees=None, weekly_totals=None):
+    """OTIMIZADO: Agrega os pontos semanais no banco com uma única consulta GROUP BY
+
+    `employees` e `weekly_totals` podem ser informados por quem já os carregou
+    (ex.: loader do dashboard do CEO) para evitar consultas repetidas.
+    """
+    current_app.logger.info("Iniciando busca de dados semanais otimizada")
+    
+    # Buscar todos os funcionários de uma vez
+    if employees is None:
         employees = Employee.query.all()
-        current_app.logger.info(f"Funcionários encontrados: {len(employees)}")
-        
-        # Buscar TODOS os registros de uma vez (otimização agressiva)
-        all_entries = Entry.query.all()
-        current_app.logger.info(f"Total de registros carregados: {len(all_entries)}")
-        
-        # Processar dados em memória (muito mais rápido)
-        employee_data = {emp.id: emp.real_name for emp in employees}
-        weekly_data = {emp.id: [0] * 5 for emp in employees}  # 5 semanas
-        
-        # Calcular datas das semanas
-        from utils.calculations import get_week_dates
-        week_dates = []
-        for week in range(1, 6):
-            start_date, end_date = get_week_dates(str(week))
-            week_dates.append((start_date, end_date))
-            current_app.logger.info(f"Processando semana {week}: {start_date} até {end_date}")
-        
-        # Processar todos os registros de uma vez
-        for entry in all_entries:
-            entry_date = entry.date
-            if hasattr(entry_date, 'strftime'):
-                entry_date_str = entry_date.strftime('%Y-%m-%d')
-            else:
-                entry_date_str = str(entry_date)[:10]  # Pegar apenas a data
-            
-            # Encontrar em qual semana está
-            for week_idx, (start_date, end_date) in enumerate(week_dates):
-                if start_date <= entry_date_str <= end_date:
-                    if entry.employee_id in weekly_data:
-                        weekly_data[entry.employee_id][week_idx] += entry.points
-                    break
-        
-        # Preparar dados para Chart.js
-        datasets = []
-        labels = [f"Semana {i}" for i in range(1, 6)]
+    current_app.logger.info(f"Funcionários encontrados: {len(employees)}")
+    
+    # Somar pontos por funcionário e semana direto no banco
+    if weekly_totals is None:
+        weekly_totals = weekly_totals_by_employee()
+    weekly_data = {emp.id: weekly_totals.get(emp.id, [0] * 5) for emp in employees}  # 5 semanas
+    
+    # Preparar dados para Chart.js
+    datasets = []
+    labels = [f"Semana {i}" for i in range(1, 6)]
+    
+    for employee in employees:
+        if employee.id in weekly_data:
+            # ✅ CORES FIXAS E DISTINTAS PARA CADA FUNCIONÁRIO
+            employee_colors = get_employee_color(employee.real_name)
+            dataset = {
+                'label': employee.real_name,
+                'data': weekly_data[employee.id],
+                'borderColor': employee_colors['border'],
+                'backgroundColor': employee_colors['bg'],
+                'tension': 0.4
+            }
+            datasets.append(dataset)
         
-        for employee in employees:
-            if employee.id in weekly_data:
-                # ✅ CORES FIXAS E DISTINTAS PARA CADA FUNCIONÁRIO
-                employee_colors = get_employee_color(employee.real_name)
-                dataset = {
-                    'label': employee.real_name,
-                    'data': weekly_data[employee.id],
-                    'borderColor': employee_colors['border'],
-                    'backgroundColor': employee_colors['bg'],
-                    'tension': 0.4
-                }
-                datasets.append(dataset)
-            
-        current_app.logger.info(f"Resultado final semanal: {len(datasets)} datasets, {len(labels)} labels")
+    current_app.logger.info(f"Resultado final semanal: {len(datasets)} datasets, {len(labels)} labels")
+    
+    return {
+        'labels': labels,
+        'datasets': datasets
+    }
+
+def get_monthly_evolution_data(employee_id=None, employees=None, weekly_totals=None):
+    """CORRIGIDO: Busca dados mensais filtrados por funcionário"""
+    current_app.logger.info(f"Iniciando busca de dados mensais para employee_id: {employee_id}")
+    
+    labels = [f"Semana {i+1}" for i in range(5)]
+    
+    # Se for para um funcionário específico, retornar dados simples
+    if employee_id:
+        employee = Employee.query.get(employee_id)
+        if not employee:
+            return {'labels': [], 'points': [], 'goals': []}
+        
+        # Agregar apenas os registros do funcionário específico
+        weekly_totals = weekly_totals_by_employee(employee_ids=[employee_id])
+        weekly_points = weekly_totals.get(employee_id, [0] * 5)  # 5 semanas
+        
+        goals = [employee.weekly_goal] * 5 if employee.weekly_goal else [0] * 5
         
         return {
             'labels': labels,
-            'datasets': datasets
+            'points': weekly_points,
+            'goals': goals
         }
-        
-    except Exception as e:
-        current_app.logger.error(f"Erro ao obter dados semanais: {str(e)}")
-        return {'labels': [], 'datasets': []}
-
-def get_monthly_evolution_data(employee_id=None):
-    """CORRIGIDO: Busca dados mensais filtrados por funcionário"""
-    try:
-        current_app.logger.info(f"Iniciando busca de dados mensais para employee_id: {employee_id}")
-        
-        # Se employee_id for fornecido, filtrar apenas esse funcionário
-        if employee_id:
-            employee = Employee.query.get(employee_id)
-            if not employee:
-                return {'labels': [], 'points': [], 'goals': []}
-            
-            # Buscar apenas registros do funcionário específico
-            all_entries = Entry.query.filter(Entry.employee_id == employee_id).all()
-            current_app.logger.info(f"Registros do funcionário {employee.real_name}: {len(all_entries)}")
-        else:
-            # Buscar todos os funcionários e registros (para CEO dashboard)
-            employees = Employee.query.all()
-            all_entries = Entry.query.all()
-            current_app.logger.info(f"Funcionários: {len(employees)}, Total de registros: {len(all_entries)}")
-        
-        # CORREÇÃO: Calcular datas das semanas (últimas 5 semanas)
-        from datetime import datetime, timedelta
-        from utils.calculations import get_week_dates
-        
-        week_dates = []
-        for week_num in range(1, 6):
-            start_date, end_date = get_week_dates(str(week_num))
-            week_dates.append((start_date, end_date))
-        
-        # Se for para um funcionário específico, retornar dados simples
-        if employee_id:
-            weekly_points = [0] * 5  # 5 semanas
-            
-            # Processar registros do funcionário
-            for entry in all_entries:
-                entry_date = entry.date
-                if hasattr(entry_date, 'strftime'):
-                    entry_date_str = entry_date.strftime('%Y-%m-%d')
-                else:
-                    entry_date_str = str(entry_date)[:10]
-                
-                # Encontrar em qual semana está
-                for week_idx, (start_date, end_date) in enumerate(week_dates):
-                    if start_date <= entry_date_str <= end_date:
-                        weekly_points[week_idx] += entry.points
-                        break
-            
-            labels = [f"Semana {i+1}" for i in range(5)]
-            goals = [employee.weekly_goal] * 5 if employee.weekly_goal else [0] * 5
-            
-            return {
-                'labels': labels,
-                'points': weekly_points,
-                'goals': goals
-            }
-        
-        # Código original para múltiplos funcionários (CEO dashboard)
-        else:
-            employees = Employee.query.all()
-            employee_data = {emp.id: emp.real_name for emp in employees}
-            monthly_data = {emp.id: [0] * 5 for emp in employees}
-            
-            # Processar todos os registros
-            for entry in all_entries:
-                entry_date = entry.date
-                if hasattr(entry_date, 'strftime'):
-                    entry_date_str = entry_date.strftime('%Y-%m-%d')
-                else:
-                    entry_date_str = str(entry_date)[:10]
-                
-                # Encontrar em qual semana está
-                for week_idx, (start_date, end_date) in enumerate(week_dates):
-                    if start_date <= entry_date_str <= end_date:
-                        if entry.employee_id in monthly_data:
-                            monthly_data[entry.employee_id][week_idx] += entry.points
-                        break
-            
-            # Preparar dados para Chart.js
-            datasets = []
-            labels = [f"Semana {i+1}" for i in range(5)]
-            
-            for employee in employees:
-                if employee.id in monthly_data:
-                    employee_colors = get_employee_color(employee.real_name)
-                    dataset = {
-                        'label': employee.real_name,
-                        'data': monthly_data[employee.id],
-                        'borderColor': employee_colors['border'],
-                        'backgroundColor': employee_colors['bg'],
-                        'tension': 0.4
-                    }
-                    datasets.append(dataset)
-            
-            return {
-                'labels': labels,
-                'datasets': datasets
+    
+    # Múltiplos funcionários (CEO dashboard)
+    if employees is None:
+        employees = Employee.query.all()
+    if weekly_totals is None:
+        weekly_totals = weekly_totals_by_employee()
+    monthly_data = {emp.id: weekly_totals.get(emp.id, [0] * 5) for emp in employees}
+    
+    # Preparar dados para Chart.js
+    datasets = []
+    
+    for employee in employees:
+        if employee.id in monthly_data:
+            employee_colors = get_employee_color(employee.real_name)
+            dataset = {
+                'label': employee.real_name,
+                'data': monthly_data[employee.id],
+                'borderColor': employee_colors['border'],
+                'backgroundColor': employee_colors['bg'],
+                'tension': 0.4
             }
-        
-    except Exception as e:
-        current_app.logger.error(f"Erro ao obter dados mensais: {str(e)}")
-        return {'labels': [], 'points': [], 'goals': []}
+            datasets.append(dataset)
+    
+    return {
+        'labels': labels,
+        'datasets': datasets
+    }
 
-def get_daily_data(employee_id=None, week=None):
+def get_daily_data(employee_id=None, week=None, employees=None):
     """Retorna dados diários para o ciclo atual (desde dia 26)"""
-    try:
-        # Calcular início do ciclo atual (dia 26)
-        today = datetime.now().date()
-        
-        if today.day >= 26:
-            # Se hoje é dia 26 ou depois, o ciclo começou no dia 26 deste mês
-            cycle_start = today.replace(day=26)
-        else:
-            # Se hoje é antes do dia 26, o ciclo começou no dia 26 do mês anterior
-            if today.month == 1:
-                cycle_start = today.replace(year=today.year-1, month=12, day=26)
-            else:
-                cycle_start = today.replace(month=today.month-1, day=26)
-        
-        start_date = cycle_start
-        end_date = today
-        
-        current_app.logger.info(f"Buscando dados diários do ciclo: {start_date} até {end_date}")
-        
+    # Ciclo atual (desde o dia 26) até hoje
+    today = cycle_calendar.today()
+    cycle_start = cycle_calendar.cycle_range()[0]
+    
+    start_date = cycle_start
+    end_date = today
+    
+    current_app.logger.info(f"Buscando dados diários do ciclo: {start_date} até {end_date}")
+    
+    if employees is None:
         if employee_id:
             employees = Employee.query.filter(Employee.id == employee_id).all()
         else:
             employees = Employee.query.all()
-            
-        current_app.logger.info(f"Funcionários para dados diários: {len(employees)}")
         
-        if not employees:
-            return {'labels': [], 'datasets': []}
-            
-        datasets = []
-        
-        # Criar labels desde o início do ciclo até hoje
-        labels = []
-        dates = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            labels.append(current_date.strftime('%d/%m'))
-            dates.append(current_date.strftime('%Y-%m-%d'))
-            current_date += timedelta(days=1)
-        
-        current_app.logger.info(f"Datas para análise: {dates}")
-        
-        for employee in employees:
-            if not employee or not employee.real_name:
-                continue
-                
-            data = []
-            
-            for date_str in dates:
-                try:
-                    # Buscar entradas do dia
-                    entries = Entry.query.filter(
-                        Entry.employee_id == employee.id,
-                        func.date(Entry.date) == date_str
-                    ).all()
-                    
-                    daily_points = sum(entry.points for entry in entries)
-                    data.append(float(daily_points))
-                    
-                    current_app.logger.info(f"Pontos de {employee.real_name} em {date_str}: {daily_points}")
-                    
-                except Exception as e:
-                    current_app.logger.error(f"Erro ao processar dia {date_str} para {employee.real_name}: {str(e)}")
-                    data.append(0.0)
-            
-            colors = get_employee_color(employee.real_name)
-            
-            datasets.append({
-                'label': str(employee.real_name),
-                'data': data,
-                'borderColor': colors['border'],
-                'backgroundColor': colors['bg'],
-                'tension': 0.4,
-                'fill': False
-            })
-        
-        result = {
-            'labels': labels,
-            'datasets': datasets
-        }
-        
-        current_app.logger.info(f"Resultado final diário: {len(datasets)} datasets, {len(labels)} labels")
-        return result
-        
-    except Exception as e:
-        current_app.logger.error(f"Erro ao obter dados diários: {str(e)}")
-        import traceback
-        current_app.logger.error(f"Traceback: {traceback.format_exc()}")
+    current_app.logger.info(f"Funcionários para dados diários: {len(employees)}")
+    
+    if not employees:
         return {'labels': [], 'datasets': []}
+        
+    employees = [employee for employee in employees if employee and employee.real_name]
+    
+    # Uma única consulta para o ciclo inteiro de todos os funcionários
+    days, daily_matrix = build_daily_matrix(
+        [employee.id for employee in employees], start_date, end_date
+    )
+    labels = [day.strftime('%d/%m') for day in days]
+    
+    datasets = []
+    for employee in employees:
+        colors = get_employee_color(employee.real_name)
+        
+        datasets.append({
+            'label': str(employee.real_name),
+            'data': daily_matrix[employee.id],
+            'borderColor': colors['border'],
+            'backgroundColor': colors['bg'],
+            'tension': 0.4,
+            'fill': False
+        })
+    
+    result = {
+        'labels': labels,
+        'datasets': datasets
+    }
+    
+    current_app.logger.info(f"Resultado final diário: {len(datasets)} datasets, {len(labels)} labels")
+    return result
 
 def get_daily_data_by_employee(employee_id, week):
     """Retorna dados diários para um funcionário específico em uma semana"""
@@ -273,6 +158,10 @@ def get_daily_data_by_employee(employee_id, week):
 
 def get_weekly_evolution_data(employee_id=None):
     """Retorna dados de evolução semanal para um funcionário específico ou todos"""
+    if employee_id:
+        # Consultar apenas o funcionário pedido em vez da equipe inteira
+        employees = Employee.query.filter(Employee.id == employee_id).all()
+        return get_weekly_progress_data(employees, weekly_totals_by_employee(employee_ids=[employee_id]))
     return get_weekly_progress_data()  # Usar a mesma função
 
 def get_employee_color(employee_name):
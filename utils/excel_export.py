@@ -0,0 +1,317 @@
+"""Exportação em streaming dos registros por funcionário.
+
+Cada funcionário gera uma planilha escrita em modo write-only do openpyxl
+(memória constante, linhas lidas do banco em lotes) e o ZIP é enviado para
+a resposta à medida que cada arquivo fica pronto, sem montar o arquivo
+inteiro em memória.
+
+No modo write-only as larguras das colunas precisam ser definidas antes da
+primeira linha, então os máximos de comprimento de cada coluna (e o total
+de pontos) vêm de uma consulta agregada feita antes de escrever as linhas.
+
+Com EXPORT_WORKERS > 1 as planilhas são geradas em paralelo por um pool de
+processos (a serialização do xlsx é CPU-bound) reaproveitado entre
+exportações; cada processo do pool recebe a URL do banco no initializer,
+mantém sua própria conexão e grava a planilha em um arquivo temporário, e
+o ZIP é montado na ordem fixa dos funcionários.
+
+Com EXPORT_CACHE_ENABLED cada planilha gerada fica no result_cache, chaveada
+pela geração de dados do funcionário (invalidada a cada escrita) e pela
+assinatura dos registros (quantidade, maior id, total e comprimentos). Uma
+nova exportação só gera novamente as planilhas de quem teve registros
+alterados; as demais vêm prontas do cache.
+"""
+import multiprocessing
+import os
+import io
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+from sqlalchemy import cast, create_engine, func, select, String
+
+from models import db, Entry
+from utils.result_cache import RESET_SCOPE, employee_scope, result_cache
+
+EXPORT_HEADERS = ['Data', 'Refinaria', 'Pontos', 'Observações']
+MAX_COLUMN_WIDTH = 50
+FETCH_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+# Arquivos temporários ficam em memória até este tamanho e depois vão para disco
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+EXPORT_FILENAME = 'relatorios_funcionarios.zip'
+
+
+class ZipStream:
+    """Destino de escrita não posicionável para o ZipFile; acumula bytes até serem consumidos"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Retorna (e descarta) tudo o que foi escrito desde a última chamada"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def employee_export_stats(employee_id, connection=None):
+    """Quantidade de registros, total de pontos, maior comprimento de cada coluna e maior id"""
+    executor = connection if connection is not None else db.session
+    count, last_id, total, date_len, refinery_len, points_len, observations_len = executor.execute(select(
+        func.count(Entry.id),
+        func.max(Entry.id),
+        func.sum(Entry.points),
+        func.max(func.length(Entry.date)),
+        func.max(func.length(Entry.refinery)),
+        func.max(func.length(cast(Entry.points, String))),
+        func.max(func.length(func.coalesce(Entry.observations, '')))
+    ).where(Entry.employee_id == employee_id)).one()
+    lengths = [date_len or 0, refinery_len or 0, points_len or 0, observations_len or 0]
+    return count, int(total or 0), lengths, last_id
+
+
+def employee_export_rows(employee_id, connection=None):
+    """Linhas (data, refinaria, pontos, observações) do funcionário, lidas em lotes"""
+    executor = connection if connection is not None else db.session
+    return executor.execute(
+        select(
+            Entry.date,
+            Entry.refinery,
+            Entry.points,
+            Entry.observations
+        ).where(
+            Entry.employee_id == employee_id
+        ).order_by(Entry.date.desc()),
+        execution_options={'yield_per': FETCH_BATCH_SIZE}
+    )
+
+
+def column_widths(lengths, total_row):
+    """Larguras a partir dos máximos por coluna (dados, cabeçalho e linha de total)"""
+    widths = []
+    for index, length in enumerate(lengths):
+        longest = max(length, len(EXPORT_HEADERS[index]), len(str(total_row[index])))
+        widths.append(min(longest + 2, MAX_COLUMN_WIDTH))
+    return widths
+
+
+def write_employee_workbook(fileobj, name, monthly_goal, stats, rows):
+    """Escreve a planilha do funcionário em modo write-only em `fileobj`"""
+    _, total_points, lengths, _ = stats
+
+    # Linha de total
+    remaining_monthly = max(0, monthly_goal - total_points)
+    total_row = ['Total', '', total_points, f'Restante mensal: {remaining_monthly}']
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=name)
+
+    # Larguras precisam ser definidas antes da primeira linha no modo write-only
+    for index, width in enumerate(column_widths(lengths, total_row), 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    # Cabeçalhos
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header = []
+    for title in EXPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal="center")
+        header.append(cell)
+    ws.append(header)
+
+    # Dados
+    for date, refinery, points, observations in rows:
+        ws.append([date, refinery, points, observations or ''])
+
+    ws.append(total_row)
+    wb.save(fileobj)
+
+
+# Pools de exportação por processo web e engine de cada processo do pool
+_pools = {}
+_pools_lock = threading.Lock()
+_worker_engine = None
+
+
+def export_cache_key(employee, stats):
+    """Chave da planilha: muda com a geração do funcionário ou com os registros dele"""
+    count, total, lengths, last_id = stats
+    return ':'.join(str(part) for part in (
+        'export:xlsx', employee.id,
+        result_cache.generation(RESET_SCOPE), result_cache.generation(employee_scope(employee.id)),
+        count, last_id, total, *lengths,
+        employee.monthly_goal, employee.real_name
+    ))
+
+
+def cached_workbook(key):
+    """Planilha já gerada (bytes) ou None"""
+    if key is None:
+        return None
+    return result_cache.load(key)
+
+
+def configure_export_worker(database_url):
+    """Initializer dos processos do pool: conexão própria com o banco (a URL não vai nas tarefas)"""
+    global _worker_engine
+    # pool_pre_ping: o processo vive entre exportações e a conexão pode ter caído
+    _worker_engine = create_engine(database_url, pool_pre_ping=True)
+
+
+def export_pool(workers, database_url):
+    """Pool de exportação deste processo (após fork do gunicorn cada worker cria o seu)"""
+    key = (os.getpid(), workers, database_url)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # 'spawn': não herdar threads/conexões do worker web no processo filho
+            pool = _pools[key] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=configure_export_worker, initargs=(database_url,)
+            )
+        return pool
+
+
+def discard_export_pool(workers, database_url):
+    with _pools_lock:
+        pool = _pools.pop((os.getpid(), workers, database_url), None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_employee_file(employee_id, name, monthly_goal, stats):
+    """Executado no pool: gera a planilha em um arquivo temporário e retorna o caminho"""
+    with _worker_engine.connect() as connection:
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        try:
+            with os.fdopen(fd, 'wb') as workbook_file:
+                write_employee_workbook(
+                    workbook_file, name, monthly_goal, stats,
+                    employee_export_rows(employee_id, connection)
+                )
+        except Exception:
+            os.remove(path)
+            raise
+    return path
+
+
+def remove_rendered_file(future):
+    """Callback: apaga a planilha de uma tarefa que terminou depois do fim da exportação"""
+    if not future.cancelled() and future.exception() is None and os.path.exists(future.result()):
+        os.remove(future.result())
+
+
+def pending_employees(employees, cache):
+    """(funcionário, stats, chave, planilha em cache) de quem tem registros, na ordem recebida"""
+    for employee in employees:
+        stats = employee_export_stats(employee.id)
+        if not stats[0]:
+            continue
+        key = export_cache_key(employee, stats) if cache else None
+        yield employee, stats, key, cached_workbook(key)
+
+
+def serial_employee_files(employees, cache=False):
+    """Gera (nome, arquivo) das planilhas uma a uma no próprio processo"""
+    for employee, stats, key, data in pending_employees(employees, cache):
+        if data is not None:
+            yield employee.real_name, io.BytesIO(data)
+            continue
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as workbook_file:
+            write_employee_workbook(
+                workbook_file, employee.real_name, employee.monthly_goal, stats,
+                employee_export_rows(employee.id)
+            )
+            workbook_file.seek(0)
+            if key is not None:
+                result_cache.store(key, workbook_file.read())
+                workbook_file.seek(0)
+            yield employee.real_name, workbook_file
+
+
+def parallel_employee_files(employees, workers, database_url, cache=False):
+    """Gera (nome, arquivo) das planilhas em um pool de processos, na ordem dos funcionários"""
+    # Consultas de stats e cache no processo principal; só as planilhas faltantes vão para o pool
+    parts = list(pending_employees(employees, cache))
+    pool = export_pool(workers, database_url)
+    try:
+        futures = [
+            None if data is not None else pool.submit(
+                render_employee_file, employee.id, employee.real_name, employee.monthly_goal, stats
+            )
+            for employee, stats, key, data in parts
+        ]
+    except BrokenProcessPool:
+        discard_export_pool(workers, database_url)
+        raise
+    consumed = 0
+    try:
+        for (employee, _, key, data), future in zip(parts, futures):
+            if future is None:
+                yield employee.real_name, io.BytesIO(data)
+                consumed += 1
+                continue
+            try:
+                path = future.result()
+            except BrokenProcessPool:
+                # Processo do pool morreu: a próxima exportação cria um pool novo
+                discard_export_pool(workers, database_url)
+                raise
+            consumed += 1
+            try:
+                with open(path, 'rb') as workbook_file:
+                    if key is not None:
+                        result_cache.store(key, workbook_file.read())
+                        workbook_file.seek(0)
+                    yield employee.real_name, workbook_file
+            finally:
+                os.remove(path)
+    finally:
+        # Download interrompido ou erro: cancelar o que não começou e não deixar arquivos para trás
+        # (o pool continua vivo para as próximas exportações)
+        for future in futures[consumed:]:
+            if future is not None and not future.cancel():
+                future.add_done_callback(remove_rendered_file)
+
+
+def iter_export_zip(employees, workers=0, database_url=None, cache=False):
+    """Gera o ZIP com uma planilha por funcionário, em pedaços, à medida que é escrito"""
+    if workers > 1 and database_url:
+        employee_files = parallel_employee_files(employees, workers, database_url, cache)
+    else:
+        employee_files = serial_employee_files(employees, cache)
+
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, workbook_file in employee_files:
+            with zip_file.open(f"{name}.xlsx", 'w') as zip_entry:
+                while True:
+                    chunk = workbook_file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    zip_entry.write(chunk)
+                    data = stream.drain()
+                    if data:
+                        yield data
+            data = stream.drain()
+            if data:
+                yield data
+    # Diretório central do ZIP
+    yield stream.drain()
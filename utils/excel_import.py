@@ -0,0 +1,145 @@
+"""Importação em massa dos registros das planilhas Excel para Entry.
+
+Os registros vêm de `extract_data_from_excel` (aba Excel) e o funcionário
+de cada registro é identificado pelo nome derivado do arquivo, comparado
+com `real_name` e com o campo legado `name` (sem acentos, maiúsculas ou
+espaços extras). Nomes sem funcionário cadastrado são apenas relatados.
+
+Um registro já existente no banco (mesmo funcionário, data/hora,
+refinaria e pontos) não é inserido de novo, então importar a mesma pasta
+mais de uma vez não duplica nada. As chaves existentes são lidas em uma
+consulta por importação (limitada ao intervalo de datas das planilhas) e
+os registros novos são gravados em lotes com executemany, sem passar
+pelo ORM objeto a objeto. O daily_rollup recebe um upsert por
+funcionário/dia/refinaria e tudo é gravado na mesma transação.
+"""
+import unicodedata
+
+from sqlalchemy import select
+
+from models import db, Employee, Entry
+from utils.result_cache import result_cache
+from utils.rollup import add_entries_to_rollup
+
+IMPORT_BATCH_SIZE = 1000
+# Mesmo formato das datas gravadas pelo registro de pontos
+ENTRY_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def normalize_name(name):
+    """Nome comparável: sem acentos, minúsculo e com espaços simples"""
+    text = unicodedata.normalize('NFKD', str(name or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def employee_index():
+    """{nome normalizado: funcionário} a partir de real_name e do nome legado"""
+    index = {}
+    for employee in Employee.query.order_by(Employee.id).all():
+        for name in (employee.real_name, employee.name):
+            key = normalize_name(name)
+            # Em caso de nomes repetidos vale o funcionário mais antigo
+            if key and key not in index:
+                index[key] = employee
+    return index
+
+
+def entry_key(row):
+    """Identidade de um registro para a deduplicação"""
+    return row['employee_id'], row['date_time'], row['refinery'], row['points']
+
+
+def entry_rows(records, employees):
+    """Converte os registros das planilhas em linhas de Entry.
+
+    Retorna (linhas, nomes sem funcionário, registros sem data).
+    """
+    rows = []
+    unknown = set()
+    without_date = 0
+    for record in records:
+        employee = employees.get(normalize_name(record.get('employee')))
+        if employee is None:
+            unknown.add(record.get('employee'))
+            continue
+        date_value = record.get('date')
+        if date_value is None:
+            without_date += 1
+            continue
+        date_time = date_value.to_pydatetime() if hasattr(date_value, 'to_pydatetime') else date_value
+        rows.append({
+            'employee_id': employee.id,
+            # Bulk insert não passa pelo validador de Entry: date_time vai junto
+            'date': date_time.strftime(ENTRY_DATE_FORMAT),
+            'date_time': date_time.replace(microsecond=0),
+            'refinery': record.get('refinery') or employee.default_refinery or '',
+            'points': int(round(record.get('points') or 0)),
+            'observations': None
+        })
+    return rows, sorted(str(name) for name in unknown), without_date
+
+
+def existing_keys(rows):
+    """Chaves dos registros já gravados para os funcionários e o intervalo de datas das linhas"""
+    if not rows:
+        return set()
+    employee_ids = {row['employee_id'] for row in rows}
+    dates = [row['date_time'] for row in rows]
+    result = db.session.execute(
+        select(
+            Entry.employee_id,
+            Entry.date_time,
+            Entry.refinery,
+            Entry.points
+        ).where(
+            Entry.employee_id.in_(employee_ids),
+            Entry.date_time.between(min(dates), max(dates))
+        ),
+        execution_options={'yield_per': IMPORT_BATCH_SIZE}
+    )
+    return {tuple(row) for row in result}
+
+
+def import_records(records, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """Grava em Entry os registros das planilhas que ainda não existem no banco.
+
+    Com `dry_run` nada é gravado; o resultado mostra o que seria importado.
+    """
+    batch_size = max(1, batch_size)
+    rows, unknown, without_date = entry_rows(records, employee_index())
+
+    # Duplicados: já gravados no banco ou repetidos entre as planilhas
+    seen = existing_keys(rows)
+    new_rows = []
+    for row in rows:
+        key = entry_key(row)
+        if key in seen:
+            continue
+        seen.add(key)
+        new_rows.append(row)
+
+    inserted_by_employee = {}
+    for row in new_rows:
+        inserted_by_employee[row['employee_id']] = inserted_by_employee.get(row['employee_id'], 0) + 1
+
+    if new_rows and not dry_run:
+        try:
+            insert = Entry.__table__.insert()
+            for start in range(0, len(new_rows), batch_size):
+                db.session.execute(insert, new_rows[start:start + batch_size])
+            add_entries_to_rollup(new_rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        result_cache.invalidate(*inserted_by_employee)
+
+    return {
+        'inserted': len(new_rows),
+        'duplicates': len(rows) - len(new_rows),
+        'without_date': without_date,
+        'unknown_employees': unknown,
+        'employees': inserted_by_employee,
+        'dry_run': dry_run
+    }
@@ -0,0 +1,510 @@
+"""Leitura vetorizada das planilhas de registros (pasta 'registros monitorar').
+
+As colunas são identificadas uma única vez por arquivo e a conversão de
+datas, o mês da empresa (ciclo 26 ao 25), a conversão de pontos e os totais
+por funcionário/refinaria/mês são feitos sobre colunas inteiras do pandas,
+em vez de linha a linha com DataFrame.iterrows().
+
+Os carregadores (routes/excel_dashboard*.py e workers/excel_processor.py)
+mantêm suas próprias regras de filtro e formatos de saída; aqui ficam apenas
+as operações em comum.
+
+Com EXCEL_LOAD_WORKERS > 1 os arquivos de uma pasta são lidos em paralelo
+(a leitura do xlsx é CPU-bound) por um pool de processos reaproveitado entre
+requisições; os resultados voltam na ordem dos arquivos.
+
+O resultado de cada arquivo fica em um cache em disco (EXCEL_PARSE_CACHE_DIR,
+um pickle por arquivo, em diretório privado do usuário do app), validado por caminho, tamanho, mtime e hash do
+conteúdo: só arquivos novos ou alterados são lidos de novo. Planilhas de
+meses passados não mudam e são reaproveitadas em toda recarga.
+
+Planilhas a partir de EXCEL_STREAM_MIN_BYTES são lidas em modo streaming
+(openpyxl read-only) em blocos de EXCEL_CHUNK_ROWS linhas, agregados um a
+um: o pico de memória não depende do tamanho da planilha, apenas dos
+registros válidos extraídos dela.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from utils.cache_backends import ensure_private_directory
+from utils.cycle_calendar import CYCLE_START_DAY
+
+NO_DATE = 'Sem Data'
+MONTH_SUFFIXES = [' Abril', ' Maio', ' Junho', ' Julho', ' Agosto', ' Setembro', ' Outubro', ' Novembro', ' Dezembro']
+
+DATE_KEYWORDS = ['data', 'date', 'dia']
+EMPLOYEE_KEYWORDS = ['funcionario', 'employee', 'nome', 'name']
+POINTS_KEYWORDS = ['ponto', 'pontos', 'valor', 'value', 'total']
+REFINERY_KEYWORDS = ['refinaria', 'refinery']
+
+# Campos de registro que podem compor a chave de duplicidade (EXCEL_DEDUP_KEY)
+DEDUP_FIELDS = ('date', 'points', 'refinery', 'month')
+DEFAULT_DEDUP_KEY = ('date', 'points')
+
+# Leitura em streaming: tamanho mínimo do arquivo e linhas por bloco
+DEFAULT_STREAM_MIN_BYTES = 1024 * 1024
+DEFAULT_CHUNK_ROWS = 10000
+# Textos tratados como vazio, como no pd.read_excel
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+# Colunas usadas quando nenhuma palavra-chave bate
+DEFAULT_COLUMNS = {'date': 'Data', 'points': 'Pontos', 'refinery': 'Refinaria'}
+
+# Incrementar quando o formato do resultado dos extratores mudar (invalida o cache em disco)
+PARSE_CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Pools de processos por (pid, tamanho): criados na primeira carga e reaproveitados
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def parse_dedup_key(value):
+    """Campos da chave de duplicidade a partir de 'date,points[,refinery]' (padrão: data e pontos)"""
+    if not value:
+        return DEFAULT_DEDUP_KEY
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    invalid = [field for field in fields if field not in DEDUP_FIELDS]
+    if invalid or not fields:
+        raise ValueError(f"EXCEL_DEDUP_KEY inválida: {value} (campos válidos: {', '.join(DEDUP_FIELDS)})")
+    return fields
+
+
+def read_sheet(file_path):
+    """Lê a primeira aba da planilha"""
+    return pd.read_excel(file_path, engine='openpyxl')
+
+
+def header_names(header):
+    """Nomes de coluna como no pd.read_excel ('Unnamed: n' para vazios, '.1' em repetidos)"""
+    names = []
+    seen = {}
+    for index, value in enumerate(header):
+        name = f"Unnamed: {index}" if value is None or value == '' else value
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(f"{name}.{count}" if count else name)
+    return names
+
+
+def convert_cell(value):
+    """Valor da célula como o pd.read_excel entrega (inteiros sem '.0', textos vazios como None)"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value in NA_STRINGS:
+        return None
+    return value
+
+
+def iter_sheet_chunks(file_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Primeira aba em DataFrames de até `chunk_rows` linhas (índice contínuo entre blocos).
+
+    Usa o modo read-only do openpyxl: as linhas são lidas do arquivo à medida
+    que os blocos são consumidos. Linhas vazias no fim da aba são ignoradas.
+    Uma aba sem linhas de dados gera um único DataFrame vazio com as colunas.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # A dimensão gravada no arquivo pode estar errada
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = list(next(rows, None) or [])
+        while header and header[-1] is None:
+            header.pop()
+        columns = header_names(header)
+        width = len(columns)
+
+        chunk = []
+        empty_rows = []  # linhas vazias só entram se houver dados depois delas
+        start = 0
+        produced = False
+        for row in rows:
+            values = [convert_cell(value) for value in row[:width]]
+            values += [None] * (width - len(values))
+            if all(value is None for value in values):
+                empty_rows.append(values)
+                continue
+            chunk.extend(empty_rows)
+            empty_rows = []
+            chunk.append(values)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns, index=pd.RangeIndex(start, start + len(chunk)))
+                start += len(chunk)
+                produced = True
+                chunk = []
+        if chunk or not produced:
+            yield pd.DataFrame(chunk, columns=columns, index=pd.RangeIndex(start, start + len(chunk)))
+    finally:
+        workbook.close()
+
+
+class SheetReader:
+    """Escolhe entre leitura inteira (pd.read_excel) e em blocos conforme o tamanho do arquivo"""
+
+    def __init__(self, stream_min_bytes=DEFAULT_STREAM_MIN_BYTES, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.stream_min_bytes = stream_min_bytes
+        self.chunk_rows = chunk_rows
+
+    def init_app(self, app):
+        """Lê EXCEL_STREAM_MIN_BYTES e EXCEL_CHUNK_ROWS da configuração"""
+        configure_sheet_reader(
+            app.config.get('EXCEL_STREAM_MIN_BYTES', self.stream_min_bytes),
+            app.config.get('EXCEL_CHUNK_ROWS', self.chunk_rows)
+        )
+
+    def settings(self):
+        return self.stream_min_bytes, self.chunk_rows
+
+    def chunks(self, file_path):
+        """DataFrames da primeira aba (um só para arquivos pequenos)"""
+        if os.path.getsize(file_path) >= self.stream_min_bytes:
+            yield from iter_sheet_chunks(file_path, self.chunk_rows)
+        else:
+            yield read_sheet(file_path)
+
+
+# Instância compartilhada (configurada por init_app e nos processos do pool)
+sheet_reader = SheetReader()
+
+
+def configure_sheet_reader(stream_min_bytes, chunk_rows):
+    """Também usado como initializer dos processos do pool de leitura"""
+    sheet_reader.stream_min_bytes = stream_min_bytes
+    sheet_reader.chunk_rows = chunk_rows
+
+
+def employee_name_from_path(file_path, strip_month=True):
+    """Nome do funcionário a partir do nome do arquivo (ex.: 'Wesley Julho.xlsx' → 'Wesley')"""
+    employee_name = os.path.basename(file_path).replace('.xlsx', '').replace('.xls', '')
+    if strip_month:
+        for pattern in MONTH_SUFFIXES:
+            if pattern in employee_name:
+                employee_name = employee_name.replace(pattern, '')
+                break
+    return employee_name
+
+
+def detect_columns(columns, roles, defaults=DEFAULT_COLUMNS):
+    """Mapeia papel → coluna a partir das palavras-chave.
+
+    `roles` é uma lista [(papel, palavras-chave)] testada em ordem para cada
+    coluna (a primeira que bate classifica a coluna); se mais de uma coluna
+    bater com o mesmo papel, vale a última. Papéis sem coluna usam `defaults`
+    se a coluna padrão existir.
+    """
+    mapping = {role: None for role, _ in roles}
+    for col in columns:
+        col_lower = str(col).lower()
+        for role, keywords in roles:
+            if any(keyword in col_lower for keyword in keywords):
+                mapping[role] = col
+                break
+    for role, column in (defaults or {}).items():
+        if role in mapping and not mapping[role] and column in columns:
+            mapping[role] = column
+    return mapping
+
+
+def parse_dates(values):
+    """Datas da coluna inteira; valores inválidos viram NaT"""
+    return pd.to_datetime(values, errors='coerce', format='mixed')
+
+
+def parse_points(values):
+    """Pontos como float; valores ausentes ou inválidos viram 0"""
+    return pd.to_numeric(values, errors='coerce').fillna(0).astype(float)
+
+
+def clean_text(values):
+    """Texto sem espaços nas pontas; ausentes viram None"""
+    present = values.notna()
+    cleaned = pd.Series(None, index=values.index, dtype=object)
+    cleaned[present] = values[present].astype(str).str.strip().astype(object)
+    return cleaned
+
+
+def cycle_month_keys(dates):
+    """Mês da empresa 'MM/YYYY' de cada data (dia >= 26 vai para o mês seguinte); NaT → 'Sem Data'"""
+    keys = pd.Series(NO_DATE, index=dates.index, dtype=object)
+    valid = dates.notna()
+    if valid.any():
+        valid_dates = dates[valid]
+        month = valid_dates.dt.month + (valid_dates.dt.day >= CYCLE_START_DAY)
+        year = valid_dates.dt.year + (month > 12)
+        month = month.where(month <= 12, 1)
+        keys[valid] = (month.astype(str).str.zfill(2) + '/' + year.astype(str)).astype(object)
+    return keys
+
+
+def header_row_mask(df):
+    """Marca a primeira linha se ela repetir o cabeçalho ('Data' na primeira coluna)"""
+    mask = pd.Series(False, index=df.index)
+    if len(df) and df.index[0] == 0:
+        first = df.iloc[0, 0]
+        if isinstance(first, str) and 'Data' in first:
+            mask.iloc[0] = True
+    return mask
+
+
+def total_row_mask(df, columns):
+    """Linhas de total ('Total' em alguma das colunas informadas)"""
+    mask = pd.Series(False, index=df.index)
+    for col in columns:
+        if col:
+            values = df[col]
+            mask |= values.notna() & values.astype(str).str.lower().eq('total')
+    return mask
+
+
+def records_frame(df, date_column, points_column, refinery_column=None,
+                  skip_header=True, skip_totals=False, drop_duplicates=False, keep_raw_date=False):
+    """Registros válidos (pontos > 0) com data, pontos, refinaria e mês da empresa.
+
+    Retorna um DataFrame com as colunas date (Timestamp/NaT), points (float),
+    refinery (str/None) e month ('MM/YYYY' ou 'Sem Data'), na ordem da planilha.
+    Com drop_duplicates, linhas com a mesma data e pontos aparecem uma vez só;
+    com keep_raw_date, a coluna raw_date guarda a data como veio na planilha.
+    """
+    keep = pd.Series(True, index=df.index)
+    if skip_header:
+        keep &= ~header_row_mask(df)
+    if skip_totals:
+        keep &= ~total_row_mask(df, [date_column, points_column])
+    df = df[keep]
+
+    if points_column:
+        points = parse_points(df[points_column])
+    else:
+        points = pd.Series(0.0, index=df.index)
+    if date_column:
+        dates = parse_dates(df[date_column])
+    else:
+        dates = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    if refinery_column:
+        refineries = clean_text(df[refinery_column])
+    else:
+        refineries = pd.Series(None, index=df.index, dtype=object)
+
+    frame = pd.DataFrame({'date': dates, 'points': points, 'refinery': refineries})
+    if keep_raw_date:
+        frame['raw_date'] = df[date_column] if date_column else None
+    frame = frame[frame['points'] > 0]
+    if drop_duplicates:
+        frame = frame.drop_duplicates(subset=['date', 'points'])
+    frame['month'] = cycle_month_keys(frame['date'])
+    return frame
+
+
+def load_records(file_path, roles, defaults=DEFAULT_COLUMNS, drop_duplicates=False, **options):
+    """Colunas detectadas e registros válidos da planilha, agregados bloco a bloco.
+
+    Retorna (colunas, registros); registros é None se a planilha não tiver
+    linhas. As opções são as de records_frame; a remoção de duplicados é
+    feita no fim, sobre todos os blocos.
+    """
+    columns = None
+    frames = []
+    total_rows = 0
+    for chunk in sheet_reader.chunks(file_path):
+        if columns is None:
+            columns = detect_columns(chunk.columns, roles, defaults)
+        total_rows += len(chunk)
+        frames.append(records_frame(
+            chunk, columns.get('date'), columns.get('points'), columns.get('refinery'), **options
+        ))
+    if not total_rows:
+        return columns, None
+
+    frame = pd.concat(frames) if len(frames) > 1 else frames[0]
+    if drop_duplicates:
+        frame = frame.drop_duplicates(subset=['date', 'points'])
+    return columns, frame
+
+
+def record_dicts(frame, employee_name):
+    """Lista de registros no formato usado pelos carregadores (datas ausentes viram None)"""
+    dates = frame['date'].astype(object).where(frame['date'].notna(), None)
+    refineries = frame['refinery'].astype(object).where(frame['refinery'].notna(), None)
+    return [
+        {
+            'employee': employee_name,
+            'date': date,
+            'points': points,
+            'month': month,
+            'refinery': refinery
+        }
+        for date, points, month, refinery in zip(
+            dates.tolist(), frame['points'].tolist(), frame['month'].tolist(), refineries.tolist()
+        )
+    ]
+
+
+def refinery_totals(frame):
+    """Pontos por refinaria (refinarias vazias ignoradas), na ordem de aparição"""
+    named = frame[frame['refinery'].notna() & frame['refinery'].ne('')]
+    return {
+        refinery: float(points)
+        for refinery, points in named.groupby('refinery', sort=False)['points'].sum().items()
+    }
+
+
+def month_totals(frame, points_key='points'):
+    """{mês: {pontos, registros}} por mês da empresa, na ordem de aparição"""
+    grouped = frame.groupby('month', sort=False)['points'].agg(['sum', 'count'])
+    return {
+        month: {points_key: float(points), 'records': int(count)}
+        for month, points, count in zip(grouped.index, grouped['sum'].tolist(), grouped['count'].tolist())
+    }
+
+
+def process_pool(workers):
+    """Pool de leitura deste processo (após fork do gunicorn cada worker cria o seu)"""
+    key = (os.getpid(), workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # 'spawn': não herdar threads/conexões do worker web no processo filho
+            pool = _pools[key] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=configure_sheet_reader, initargs=sheet_reader.settings()
+            )
+        return pool
+
+
+def discard_pool(workers):
+    with _pools_lock:
+        pool = _pools.pop((os.getpid(), workers), None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def find_excel_files(folder_path):
+    """Arquivos .xlsx/.xls da pasta e subpastas, em ordem determinística"""
+    excel_files = []
+    for root, dirs, files in os.walk(folder_path):
+        for file in files:
+            if file.endswith(('.xlsx', '.xls')):
+                excel_files.append(os.path.join(root, file))
+    return sorted(excel_files)
+
+
+def file_signature(file_path):
+    """(caminho absoluto, tamanho, mtime, sha256 do conteúdo) do arquivo"""
+    stat = os.stat(file_path)
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+def files_signature(file_paths):
+    """Hash que muda quando algum dos arquivos é alterado, incluído ou removido"""
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        digest.update(f"{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class ParsedFileCache:
+    """Resultados já extraídos, um pickle por (extrator, arquivo) no diretório informado.
+
+    O diretório precisa ser privado (ver ensure_private_directory), já que
+    os arquivos são carregados com pickle.
+
+    Cada arquivo guarda a chave completa (versão, extrator, assinatura); uma
+    nova versão da planilha sobrescreve a anterior, então o diretório não
+    cresce além de um pickle por planilha.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _entry_path(self, extractor, file_path):
+        name = hashlib.sha1(f"{extractor}:{os.path.abspath(file_path)}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.pkl")
+
+    def get(self, extractor, file_path, signature):
+        try:
+            with open(self._entry_path(extractor, file_path), 'rb') as f:
+                key, result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Cache de Excel ilegível para {file_path}: {str(e)}")
+            return None
+        if key != (PARSE_CACHE_VERSION, extractor, signature):
+            return None
+        return result
+
+    def set(self, extractor, file_path, signature, result):
+        try:
+            # Gravação atômica: outro worker nunca lê um pickle pela metade
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(((PARSE_CACHE_VERSION, extractor, signature), result), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._entry_path(extractor, file_path))
+        except Exception as e:
+            logger.warning(f"Erro ao gravar cache de Excel para {file_path}: {str(e)}")
+
+
+def parse_files(extract, file_paths, workers):
+    """extract(arquivo) para cada arquivo, em paralelo se workers > 1"""
+    if workers > 1 and len(file_paths) > 1:
+        try:
+            return list(process_pool(workers).map(extract, file_paths))
+        except BrokenProcessPool as e:
+            logger.error(f"Pool de leitura de Excel interrompido, lendo em sequência: {str(e)}")
+            discard_pool(workers)
+    return [extract(file_path) for file_path in file_paths]
+
+
+def extract_files(extract, file_paths, workers=0, cache_dir=None):
+    """Resultados de extract(arquivo) na mesma ordem de `file_paths`.
+
+    `extract` precisa ser uma função de módulo (é enviada aos processos do
+    pool). Com workers <= 1, ou se o pool falhar, os arquivos são lidos em
+    sequência no próprio processo. Com `cache_dir`, arquivos inalterados vêm
+    do cache em disco e só os demais são lidos.
+    """
+    file_paths = list(file_paths)
+    if not cache_dir:
+        return parse_files(extract, file_paths, workers)
+
+    try:
+        ensure_private_directory(cache_dir)
+    except OSError as e:
+        logger.error(f"Cache de Excel desabilitado: {str(e)}")
+        return parse_files(extract, file_paths, workers)
+
+    cache = ParsedFileCache(cache_dir)
+    extractor = f"{extract.__module__}.{extract.__qualname__}"
+    signatures = [file_signature(file_path) for file_path in file_paths]
+    results = [cache.get(extractor, file_path, signature) for file_path, signature in zip(file_paths, signatures)]
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    parsed = parse_files(extract, [file_paths[index] for index in missing], workers)
+    for index, result in zip(missing, parsed):
+        results[index] = result
+        if result.get('status') == 'success':
+            cache.set(extractor, file_paths[index], signatures[index], result)
+
+    logger.info(f"♻️ {len(file_paths) - len(missing)}/{len(file_paths)} arquivos Excel reaproveitados do cache")
+    return results
@@ -0,0 +1,73 @@
+"""Paginação por cursor (keyset) para listagens de registros.
+
+Em vez de OFFSET + COUNT(*), cada página é buscada a partir da chave do
+último item da página anterior, ordenando por (date_time DESC, id DESC).
+O custo de uma página não cresce com a profundidade do histórico e usa os
+índices ix_entry_date_time / ix_entry_employee_id_date_time.
+
+O cursor enviado ao cliente é opaco (base64 de JSON) e não deve ser montado
+manualmente.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models import Entry
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado ou adulterado"""
+
+
+def encode_cursor(date_time, entry_id):
+    """Cursor opaco para a posição (date_time, id)"""
+    payload = [date_time.isoformat() if date_time else None, entry_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Converte o cursor de volta em (date_time, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_text, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        date_time = datetime.fromisoformat(date_text) if date_text else None
+        return date_time, int(entry_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def keyset_order():
+    """Ordenação estável usada pela paginação (registros sem data ficam por último)"""
+    return Entry.date_time.desc().nullslast(), Entry.id.desc()
+
+
+def keyset_after(date_time, entry_id):
+    """Condição para os registros que vêm depois de (date_time, id) na ordenação"""
+    if date_time is None:
+        return and_(Entry.date_time.is_(None), Entry.id < entry_id)
+    return or_(
+        Entry.date_time < date_time,
+        and_(Entry.date_time == date_time, Entry.id < entry_id),
+        Entry.date_time.is_(None)
+    )
+
+
+def keyset_page(query, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """Busca uma página a partir do cursor; retorna (linhas, próximo_cursor ou None).
+
+    A consulta deve projetar as colunas `id` e `date_time` de Entry.
+    """
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    if cursor:
+        query = query.filter(keyset_after(*decode_cursor(cursor)))
+    # Uma linha a mais indica se existe próxima página, sem COUNT(*)
+    rows = query.order_by(*keyset_order()).limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, encode_cursor(rows[-1].date_time, rows[-1].id)
@@ -0,0 +1,236 @@
+"""Cache de resultados com invalidação por geração de dados.
+
+Cada escrita em Entry incrementa contadores de geração (um global da
+equipe e um por funcionário). Cada valor guardado registra as gerações
+dos escopos de que depende; na leitura, se alguma geração mudou o valor
+é considerado obsoleto e apenas essa chave é recalculada. Com isso o TTL
+pode ser longo (horas) sem servir dados desatualizados.
+
+Valores e contadores ficam em um backend plugável (utils/cache_backends.py);
+com o backend 'sqlite' todos os workers do gunicorn compartilham o mesmo
+conjunto de resultados já calculados.
+
+get_or_compute faz single-flight: quando uma chave precisa ser recalculada,
+apenas um chamador (por processo, via lock local, e entre processos, via
+lease no backend) executa o cálculo; os demais aguardam o resultado ou,
+com RESULT_CACHE_STALE_TTL > 0, recebem o valor anterior enquanto isso.
+"""
+import os
+import threading
+import time
+
+from utils.cache_backends import DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES, MemoryBackend, create_backend
+from utils.cycle_calendar import cycle_calendar
+
+TEAM_SCOPE = 'team'
+RESET_SCOPE = '*'
+DEFAULT_TTL = 6 * 60 * 60  # 6 horas
+VALUE_PREFIX = 'value:'
+GENERATION_PREFIX = 'generation:'
+LEASE_PREFIX = 'lease:'
+DEFAULT_LOCK_TIMEOUT = 30  # segundos
+LOCK_STRIPES = 64
+WAIT_INTERVAL = 0.05
+
+
+def employee_scope(employee_id):
+    """Escopo de invalidação de um funcionário"""
+    return f'employee:{employee_id}'
+
+
+def daily_cache_key(name):
+    """Chave de cache válida apenas para o dia atual (semana/ciclo mudam com a data)"""
+    return f"{name}:{cycle_calendar.today().isoformat()}"
+
+
+class ResultCache:
+    """Cache com TTL e invalidação versionada sobre um backend plugável"""
+
+    def __init__(self, ttl=DEFAULT_TTL, backend=None, stale_ttl=0, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+        self.ttl = ttl
+        self.backend = backend or MemoryBackend()
+        # Janela extra em que um valor obsoleto pode ser servido durante o recálculo (0 = desabilitado)
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        # Locks por chave (listrados para não crescer sem limite)
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        # Estatísticas locais do processo
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'coalesced': 0, 'stale_served': 0}
+
+    def init_app(self, app):
+        """Configura TTL, backend e limites a partir de RESULT_CACHE_*"""
+        self.ttl = app.config.get('RESULT_CACHE_TTL', self.ttl)
+        self.stale_ttl = app.config.get('RESULT_CACHE_STALE_TTL', self.stale_ttl)
+        self.lock_timeout = app.config.get('RESULT_CACHE_LOCK_TIMEOUT', self.lock_timeout)
+        try:
+            self.backend = create_backend(
+                app.config.get('RESULT_CACHE_BACKEND', 'memory'),
+                path=app.config.get('RESULT_CACHE_PATH'),
+                max_entries=app.config.get('RESULT_CACHE_MAX_ENTRIES'),
+                max_bytes=app.config.get('RESULT_CACHE_MAX_BYTES')
+            )
+        except PermissionError as e:
+            # Caminho inseguro para um arquivo lido com pickle: cache só em memória
+            app.logger.error(f"❌ Cache de resultados em disco desabilitado: {str(e)}")
+            self.backend = MemoryBackend(
+                max_entries=app.config.get('RESULT_CACHE_MAX_ENTRIES') or DEFAULT_MAX_ENTRIES,
+                max_bytes=app.config.get('RESULT_CACHE_MAX_BYTES') or DEFAULT_MAX_BYTES
+            )
+        app.extensions['result_cache'] = self
+
+    # ------------------------------------------------------------ gerações
+
+    def generation(self, scope=TEAM_SCOPE):
+        """Geração atual de um escopo"""
+        return self.backend.get_counters([GENERATION_PREFIX + scope])[GENERATION_PREFIX + scope]
+
+    def _snapshot(self, scopes):
+        """Gerações atuais dos escopos (sempre incluindo o escopo de reset)"""
+        keys = [GENERATION_PREFIX + scope for scope in (RESET_SCOPE,) + tuple(scopes)]
+        counters = self.backend.get_counters(keys)
+        return tuple(counters[key] for key in keys)
+
+    def invalidate(self, *employee_ids):
+        """Marca como obsoletos os dados da equipe e dos funcionários informados.
+
+        Sem funcionários, invalida tudo (ex.: exclusão de todos os registros).
+        """
+        scopes = [TEAM_SCOPE] + [employee_scope(emp_id) for emp_id in employee_ids]
+        if not employee_ids:
+            scopes.append(RESET_SCOPE)
+        for scope in scopes:
+            self.backend.incr(GENERATION_PREFIX + scope)
+
+    # -------------------------------------------------------------- valores
+
+    def _lookup(self, key):
+        """Retorna (valor, fresco). Valores obsoletos ainda guardados voltam com fresco=False"""
+        entry = self.backend.get(VALUE_PREFIX + key)
+        if entry is None:
+            return None, False
+        value, stored_at, scopes, generations = entry
+        if generations != self._snapshot(scopes):
+            return value, False
+        return value, time.time() - stored_at < self.ttl
+
+    def get(self, key):
+        """Retorna o valor se ainda válido (TTL e gerações), senão None"""
+        value, fresh = self._lookup(key)
+        if fresh:
+            self._stats['hits'] += 1
+            return value
+        if value is not None:
+            self._stats['stale'] += 1
+        self._stats['misses'] += 1
+        return None
+
+    def set(self, key, value, scopes=(TEAM_SCOPE,), generations=None):
+        """Armazena o valor junto com as gerações dos escopos de que depende.
+
+        `generations` permite gravar as gerações lidas ANTES do cálculo, para
+        que uma escrita concorrente durante o cálculo torne o valor obsoleto.
+        """
+        scopes = tuple(scopes)
+        entry = (value, time.time(), scopes, generations or self._snapshot(scopes))
+        # O backend mantém o valor além do TTL para que possa ser servido como obsoleto
+        self.backend.set(VALUE_PREFIX + key, entry, self.ttl + self.stale_ttl)
+
+    def get_or_compute(self, key, compute, scopes=(TEAM_SCOPE,)):
+        """Retorna o valor em cache ou calcula, armazena e retorna.
+
+        Apenas um chamador calcula cada chave por vez; os demais aguardam o
+        resultado ou, se stale_ttl > 0 e houver valor anterior, o recebem.
+        """
+        stale, fresh = self._lookup(key)
+        if fresh:
+            self._stats['hits'] += 1
+            return stale
+        if stale is not None:
+            self._stats['stale'] += 1
+        self._stats['misses'] += 1
+        serve_stale = self.stale_ttl > 0 and stale is not None
+
+        lock = self._locks[hash(key) % LOCK_STRIPES]
+        if not lock.acquire(blocking=not serve_stale):
+            # Outra thread deste processo já está recalculando
+            self._stats['stale_served'] += 1
+            return stale
+        try:
+            value, fresh = self._lookup(key)
+            if fresh:
+                self._stats['coalesced'] += 1
+                return value
+
+            lease_key = LEASE_PREFIX + key
+            owner = f"{os.getpid()}:{threading.get_ident()}"
+            deadline = time.time() + self.lock_timeout
+            acquired = self.backend.acquire_lease(lease_key, owner, self.lock_timeout)
+            while not acquired:
+                # Outro worker está recalculando
+                if serve_stale:
+                    self._stats['stale_served'] += 1
+                    return stale
+                if time.time() >= deadline:
+                    # Lease abandonado/lento: calcular mesmo assim, sem tomar o lease do outro worker
+                    break
+                time.sleep(WAIT_INTERVAL)
+                value, fresh = self._lookup(key)
+                if fresh:
+                    self._stats['coalesced'] += 1
+                    return value
+                acquired = self.backend.acquire_lease(lease_key, owner, self.lock_timeout)
+            try:
+                generations = self._snapshot(scopes)
+                value = compute()
+                self.set(key, value, scopes, generations)
+                return value
+            finally:
+                # Só libera o lease que este chamador obteve
+                if acquired:
+                    self.backend.release_lease(lease_key, owner)
+        finally:
+            lock.release()
+
+    def delete(self, key):
+        self.backend.delete(VALUE_PREFIX + key)
+
+    # ---------------------------------------- valores sem controle de geração
+
+    def load(self, key):
+        """Lê um valor compartilhado simples (sem verificação de geração)"""
+        return self.backend.get(key)
+
+    def store(self, key, value, timeout=None):
+        """Grava um valor compartilhado simples; padrão = TTL do cache"""
+        self.backend.set(key, value, timeout or self.ttl)
+
+    def clear(self):
+        """Remove todos os valores e zera as estatísticas"""
+        self.backend.clear()
+        for stat in self._stats:
+            self._stats[stat] = 0
+
+    def stats(self):
+        """Estatísticas de uso do cache"""
+        total = self._stats['hits'] + self._stats['misses']
+        backend_stats = self.backend.stats()
+        return {
+            'hit_rate': (self._stats['hits'] / total * 100) if total > 0 else 0,
+            'hits': self._stats['hits'],
+            'misses': self._stats['misses'],
+            'stale': self._stats['stale'],
+            'coalesced': self._stats['coalesced'],
+            'stale_served': self._stats['stale_served'],
+            'total': total,
+            'size': backend_stats['entries'],
+            'bytes': backend_stats['bytes'],
+            'max_entries': backend_stats['max_entries'],
+            'max_bytes': backend_stats['max_bytes'],
+            'evictions': backend_stats['evictions'],
+            'generation': self.generation(),
+            'backend': self.backend.name,
+        }
+
+
+# Instância compartilhada (configurada em app.py via init_app)
+result_cache = ResultCache()
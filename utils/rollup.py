@@ -0,0 +1,135 @@
+"""Manutenção incremental da tabela daily_rollup.
+
+As funções de escrita só adicionam comandos à sessão atual; quem chama
+faz o commit junto com a alteração em Entry, mantendo tudo na mesma
+transação.
+"""
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Entry, DailyRollup, parse_entry_date
+from utils.result_cache import result_cache
+
+
+def _rollup_key(employee_id, date_value, refinery):
+    date_time = parse_entry_date(date_value)
+    if date_time is None:
+        return None
+    return {'employee_id': employee_id, 'day': date_time.date(), 'refinery': refinery}
+
+
+def _upsert(key, points, entries):
+    """INSERT ... ON CONFLICT somando pontos/registros (atômico entre workers)"""
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert(DailyRollup).values(points=points, entries=entries, **key)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['employee_id', 'day', 'refinery'],
+        set_={
+            'points': DailyRollup.points + stmt.excluded.points,
+            'entries': DailyRollup.entries + stmt.excluded.entries,
+        }
+    )
+    db.session.execute(stmt)
+
+
+def _subtract(key, points):
+    """Remove a contribuição de um registro e apaga a linha se ficar vazia"""
+    filters = [
+        DailyRollup.employee_id == key['employee_id'],
+        DailyRollup.day == key['day'],
+        DailyRollup.refinery == key['refinery'],
+    ]
+    DailyRollup.query.filter(*filters).update(
+        {
+            DailyRollup.points: DailyRollup.points - points,
+            DailyRollup.entries: DailyRollup.entries - 1,
+        },
+        synchronize_session=False
+    )
+    DailyRollup.query.filter(*filters, DailyRollup.entries <= 0).delete(synchronize_session=False)
+
+
+def add_entry_to_rollup(employee_id, date_value, refinery, points):
+    """Soma um registro novo ao rollup"""
+    key = _rollup_key(employee_id, date_value, refinery)
+    if key is not None:
+        _upsert(key, points, 1)
+
+
+def add_entries_to_rollup(rows):
+    """Soma um lote de registros novos ao rollup (um upsert por funcionário/dia/refinaria).
+
+    `rows` são dicionários com employee_id, date_time, refinery e points,
+    como os usados na inserção em massa de Entry.
+    """
+    totals = {}
+    for row in rows:
+        if row['date_time'] is None:
+            continue
+        key = (row['employee_id'], row['date_time'].date(), row['refinery'])
+        points, entries = totals.get(key, (0, 0))
+        totals[key] = (points + row['points'], entries + 1)
+    for (employee_id, day, refinery), (points, entries) in totals.items():
+        _upsert({'employee_id': employee_id, 'day': day, 'refinery': refinery}, points, entries)
+    return len(totals)
+
+
+def remove_entry_from_rollup(employee_id, date_value, refinery, points):
+    """Desconta um registro removido (ou o estado antigo de um registro editado)"""
+    key = _rollup_key(employee_id, date_value, refinery)
+    if key is not None:
+        _subtract(key, points)
+
+
+def clear_rollup():
+    """Esvazia o rollup (usado junto com a exclusão de todos os registros)"""
+    DailyRollup.query.delete(synchronize_session=False)
+
+
+def rebuild_daily_rollup(commit=True):
+    """Recalcula todo o rollup a partir de Entry com um único INSERT ... SELECT.
+
+    Com `commit`, invalida também todo o result_cache (que sobrevive a
+    reinícios): valores calculados com o rollup antigo deixam de valer. Sem
+    `commit`, quem chama deve invalidar depois do próprio commit.
+    """
+    day = func.date(Entry.date_time)
+    source = db.session.query(
+        Entry.employee_id,
+        day,
+        Entry.refinery,
+        func.sum(Entry.points),
+        func.count(Entry.id)
+    ).filter(
+        Entry.date_time.isnot(None)
+    ).group_by(Entry.employee_id, day, Entry.refinery)
+
+    clear_rollup()
+    db.session.execute(
+        DailyRollup.__table__.insert().from_select(
+            ['employee_id', 'day', 'refinery', 'points', 'entries'],
+            source.statement
+        )
+    )
+    if commit:
+        db.session.commit()
+        result_cache.invalidate()
+    return DailyRollup.query.count()
+
+
+def rollup_missing():
+    """Rollup vazio com registros datados em Entry (ex.: tabela criada pelo create_all sem backfill)"""
+    if db.session.query(DailyRollup.query.exists()).scalar():
+        return False
+    return db.session.query(Entry.query.filter(Entry.date_time.isnot(None)).exists()).scalar()
+
+
+def ensure_daily_rollup():
+    """Na inicialização: recalcula o rollup se ele estiver vazio e Entry tiver registros.
+
+    Retorna o número de linhas recalculadas ou None se nada precisou ser feito.
+    """
+    if not rollup_missing():
+        return None
+    return rebuild_daily_rollup()
+
@@ -0,0 +1,99 @@
+"""Atualização em segundo plano de snapshots usados pelas rotas.
+
+Uma thread daemon por worker recalcula o snapshot fora do caminho da
+requisição e o publica com uma única atribuição (troca atômica). As rotas
+apenas leem `refresher.snapshot`, que é imutável (MappingProxyType/tuplas),
+então nunca enxergam um snapshot parcialmente montado.
+
+O recálculo acontece quando a geração de dados da equipe muda (alguma
+escrita em Entry), quando o dia muda ou a cada `interval` segundos.
+"""
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from utils.cycle_calendar import cycle_calendar
+from utils.result_cache import result_cache
+
+DEFAULT_INTERVAL = 5 * 60  # segundos
+DEFAULT_POLL = 2  # segundos
+
+
+def freeze(value):
+    """Cópia somente leitura de dicts/listas aninhados"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class SnapshotRefresher:
+    """Mantém um snapshot imutável atualizado por uma thread em segundo plano"""
+
+    def __init__(self, name, loader, interval=DEFAULT_INTERVAL, poll=DEFAULT_POLL):
+        self.name = name
+        self.loader = loader
+        self.interval = interval
+        self.poll = poll
+        self.enabled = False
+        self.snapshot = None
+        self._app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._state = None  # (geração, dia) do snapshot atual
+        self._refreshed_at = 0
+
+    def init_app(self, app):
+        """Lê CRITICAL_REFRESH_* da configuração; a thread só inicia na primeira leitura"""
+        self._app = app
+        self.enabled = app.config.get('CRITICAL_REFRESH_ENABLED', False)
+        self.interval = app.config.get('CRITICAL_REFRESH_INTERVAL', self.interval)
+        self.poll = app.config.get('CRITICAL_REFRESH_POLL', self.poll)
+
+    def ensure_started(self):
+        """Inicia a thread neste processo (após fork do gunicorn a thread não é herdada)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self.snapshot = None
+            self._state = None
+            thread = threading.Thread(target=self._run, name=f'refresher-{self.name}', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stop.set()
+
+    def _current_state(self):
+        return result_cache.generation(), cycle_calendar.today()
+
+    def refresh(self):
+        """Recalcula e publica um novo snapshot"""
+        with self._app.app_context():
+            state = self._current_state()
+            snapshot = freeze(self.loader())
+        # Troca atômica: leitores veem o snapshot antigo ou o novo, nunca um meio-termo
+        self.snapshot = snapshot
+        self._state = state
+        self._refreshed_at = time.time()
+
+    def _due(self):
+        if self.snapshot is None or time.time() - self._refreshed_at >= self.interval:
+            return True
+        with self._app.app_context():
+            return self._current_state() != self._state
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._due():
+                    self.refresh()
+            except Exception as e:
+                self._app.logger.error(f"Erro ao atualizar snapshot {self.name}: {str(e)}")
+            self._stop.wait(self.poll)
@@ -0,0 +1,199 @@
+"""Exportação dos registros em CSV, Parquet e Arrow.
+
+Diferente do xlsx (uma consulta por funcionário e serialização lenta do
+openpyxl), estes formatos são gerados a partir de uma única consulta sobre
+Entry + Employee, lida em lotes e enviada em streaming:
+
+- csv: ZIP com um CSV por funcionário, ou um único CSV com a coluna
+  Funcionário (combined);
+- arrow: Arrow IPC em formato stream, um record batch por lote;
+- parquet: um row group por lote; o arquivo é montado em um temporário
+  (o rodapé do Parquet só é escrito no final) e enviado em pedaços.
+
+Parquet e Arrow dependem do pacote opcional pyarrow.
+"""
+import csv
+import io
+import tempfile
+import zipfile
+
+from sqlalchemy import select
+
+from models import Employee, Entry, db
+from utils.excel_export import CHUNK_SIZE, SPOOL_MAX_SIZE, ZipStream
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - dependência opcional
+    pyarrow = None
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet', 'arrow')
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+TABULAR_HEADERS = ['Funcionário', 'Data', 'Refinaria', 'Pontos', 'Observações']
+# Linhas por lote lidas do banco (e por row group / record batch nos formatos colunares)
+COLUMNAR_BATCH_SIZE = 64 * 1024
+CSV_BATCH_SIZE = 1000
+
+EXPORT_FILES = {
+    'csv': ('relatorios_funcionarios_csv.zip', 'application/zip'),
+    'csv_combined': ('registros.csv', 'text/csv; charset=utf-8'),
+    'parquet': ('registros.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('registros.arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+class ExportFormatUnavailable(RuntimeError):
+    """Formato pedido depende de um pacote que não está instalado"""
+
+
+class ArrowSink(ZipStream):
+    """ZipStream com a interface mínima de arquivo exigida pelo pyarrow"""
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def export_statement():
+    """Todos os registros com o nome do funcionário, agrupados por funcionário"""
+    return select(
+        Employee.real_name,
+        Entry.date,
+        Entry.refinery,
+        Entry.points,
+        Entry.observations
+    ).join(
+        Employee, Employee.id == Entry.employee_id
+    ).order_by(Employee.id, Entry.date.desc())
+
+
+def export_rows(batch_size):
+    """Linhas da exportação lidas do banco em lotes"""
+    return db.session.execute(export_statement(), execution_options={'yield_per': batch_size})
+
+
+def check_format_available(export_format):
+    if export_format in COLUMNAR_FORMATS and pyarrow is None:
+        raise ExportFormatUnavailable(f"Exportação {export_format} requer o pacote pyarrow")
+
+
+class CsvBuffer:
+    """csv.writer em memória; `take()` devolve o texto acumulado em bytes"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self.writer = csv.writer(self._buffer)
+
+    def size(self):
+        return self._buffer.tell()
+
+    def take(self):
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def iter_combined_csv(rows):
+    """CSV único com todos os registros, enviado em pedaços de ~CHUNK_SIZE"""
+    buffer = CsvBuffer()
+    buffer.writer.writerow(TABULAR_HEADERS)
+    for name, date, refinery, points, observations in rows:
+        buffer.writer.writerow([name, date, refinery, points, observations or ''])
+        if buffer.size() >= CHUNK_SIZE:
+            yield buffer.take()
+    yield buffer.take()
+
+
+def iter_csv_zip(rows):
+    """ZIP com um CSV por funcionário (mesmas colunas da planilha xlsx)"""
+    stream = ZipStream()
+    buffer = CsvBuffer()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        current_name = None
+        zip_entry = None
+        try:
+            for name, date, refinery, points, observations in rows:
+                if name != current_name:
+                    if zip_entry is not None:
+                        zip_entry.write(buffer.take())
+                        zip_entry.close()
+                    current_name = name
+                    zip_entry = zip_file.open(f"{name}.csv", 'w')
+                    buffer.writer.writerow(TABULAR_HEADERS[1:])
+                buffer.writer.writerow([date, refinery, points, observations or ''])
+                if buffer.size() >= CHUNK_SIZE:
+                    zip_entry.write(buffer.take())
+                    data = stream.drain()
+                    if data:
+                        yield data
+            if zip_entry is not None:
+                zip_entry.write(buffer.take())
+        finally:
+            if zip_entry is not None:
+                zip_entry.close()
+        data = stream.drain()
+        if data:
+            yield data
+    # Diretório central do ZIP
+    yield stream.drain()
+
+
+def arrow_schema():
+    return pyarrow.schema([
+        (TABULAR_HEADERS[0], pyarrow.string()),
+        (TABULAR_HEADERS[1], pyarrow.string()),
+        (TABULAR_HEADERS[2], pyarrow.string()),
+        (TABULAR_HEADERS[3], pyarrow.int64()),
+        (TABULAR_HEADERS[4], pyarrow.string()),
+    ])
+
+
+def iter_record_batches(rows, schema):
+    """Agrupa as linhas em record batches de até COLUMNAR_BATCH_SIZE linhas"""
+    for partition in rows.partitions(COLUMNAR_BATCH_SIZE):
+        columns = list(zip(*partition))
+        yield pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        )
+
+
+def iter_arrow_stream(rows):
+    """Arrow IPC (formato stream), enviado a cada record batch"""
+    schema = arrow_schema()
+    stream = ArrowSink()
+    with pyarrow.ipc.new_stream(stream, schema) as writer:
+        for batch in iter_record_batches(rows, schema):
+            writer.write_batch(batch)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def iter_parquet(rows):
+    """Parquet com um row group por lote; enviado em pedaços depois de fechado"""
+    schema = arrow_schema()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as parquet_file:
+        with pyarrow.parquet.ParquetWriter(parquet_file, schema, compression='snappy') as writer:
+            for batch in iter_record_batches(rows, schema):
+                writer.write_batch(batch)
+        parquet_file.seek(0)
+        while True:
+            chunk = parquet_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def tabular_export(export_format, combined=False):
+    """(gerador de bytes, nome do arquivo, mimetype) para csv, parquet ou arrow"""
+    check_format_available(export_format)
+    if export_format == 'csv':
+        if combined:
+            return iter_combined_csv(export_rows(CSV_BATCH_SIZE)), *EXPORT_FILES['csv_combined']
+        return iter_csv_zip(export_rows(CSV_BATCH_SIZE)), *EXPORT_FILES['csv']
+    if export_format == 'arrow':
+        return iter_arrow_stream(export_rows(COLUMNAR_BATCH_SIZE)), *EXPORT_FILES['arrow']
+    return iter_parquet(export_rows(COLUMNAR_BATCH_SIZE)), *EXPORT_FILES['parquet']
@@ -3,6 +3,8 @@ import os
 import logging
 import pandas as pd
 from datetime import datetime
+from utils.cycle_calendar import cycle_calendar
+from utils.excel_ingest import NO_DATE, employee_name_from_path, load_records, month_totals
 import redis
 import json
 
@@ -35,26 +37,8 @@ def get_month_from_date(date_value):
         if isinstance(date_value, str):
             date_value = pd.to_datetime(date_value)
         
-        # Extrair dia e mês
-        day = date_value.day
-        month = date_value.month
-        year = date_value.year
-        
-        # Lógica: se dia >= 26, pertence ao mês atual
-        # Se dia < 26, pertence ao mês anterior
-        if day >= 26:
-            target_month = month
-            target_year = year
-        else:
-            if month == 1:
-                target_month = 12
-                target_year = year - 1
-            else:
-                target_month = month - 1
-                target_year = year
-        
-        # Formatar como "MM/YYYY"
-        month_key = f"{target_month:02d}/{target_year}"
+        # Mês da empresa: 26 do mês anterior ao 25 do mês (ex.: 26/03 a 25/04 → 04)
+        month_key = cycle_calendar.month_key(date_value)
         
         return month_key
         
@@ -63,15 +47,18 @@ def get_month_from_date(date_value):
         return 'Sem Data'
 
 def extract_data_from_excel_async(file_path):
-    """Extrair dados de um arquivo Excel - versão assíncrona"""
+    """Extrair dados de um arquivo Excel - versão assíncrona (operações vetorizadas por coluna)"""
     try:
         logger.info(f"Processando arquivo: {file_path}")
         
-        # Ler arquivo Excel
-        df = pd.read_excel(file_path, engine='openpyxl')
+        # Ler a planilha (em blocos, se for grande) identificando as colunas de data e pontos uma vez
+        columns, frame = load_records(file_path, [
+            ('date', ['data', 'date']),
+            ('points', ['ponto', 'pontos'])
+        ], defaults=None, skip_header=False, keep_raw_date=True)
         
-        # Verificar se o DataFrame tem dados
-        if df.empty:
+        # Verificar se a planilha tem dados
+        if frame is None:
             return {
                 'status': 'error',
                 'message': 'Arquivo vazio'
@@ -79,14 +66,7 @@ def extract_data_from_excel_async(file_path):
         
         # Extrair nome do funcionário do nome do arquivo (remover mês)
         file_name = os.path.basename(file_path)
-        employee_name = file_name.replace('.xlsx', '').replace('.xls', '')
-        
-        # Remover mês do nome do funcionário
-        month_patterns = [' Abril', ' Maio', ' Junho', ' Julho', ' Agosto', ' Setembro', ' Outubro', ' Novembro', ' Dezembro']
-        for pattern in month_patterns:
-            if pattern in employee_name:
-                employee_name = employee_name.replace(pattern, '')
-                break
+        employee_name = employee_name_from_path(file_path)
         
         # Processar dados específicos
         file_data = {
@@ -95,69 +75,30 @@ def extract_data_from_excel_async(file_path):
             'records': []
         }
         
-        # Tentar identificar colunas relevantes
-        columns = df.columns.tolist()
-        logger.info(f"Colunas encontradas: {columns}")
+        logger.info(f"Colunas identificadas: {columns}")
         
-        # Processar cada linha do DataFrame
-        for index, row in df.iterrows():
-            try:
-                # Tentar identificar colunas de data e pontos
-                date_col = None
-                points_col = None
+        if columns['date'] and columns['points']:
+            if not frame.empty:
+                file_data['employees'][employee_name] = {
+                    'total_points': float(frame['points'].sum()),
+                    'records': len(frame)
+                }
+                file_data['months'] = month_totals(frame, points_key='total_points')
                 
-                for col in columns:
-                    col_lower = str(col).lower()
-                    if 'data' in col_lower or 'date' in col_lower:
-                        date_col = col
-                    elif 'ponto' in col_lower or 'pontos' in col_lower:
-                        points_col = col
-                
-                if date_col and points_col:
-                    date_value = row[date_col]
-                    points_value = row[points_col]
-                    
-                    # Converter pontos para número
-                    try:
-                        points = float(points_value) if pd.notna(points_value) else 0
-                    except (ValueError, TypeError):
-                        points = 0
-                    
-                    if points > 0:
-                        month_key = get_month_from_date(date_value)
-                        
-                        # Adicionar ao funcionário
-                        if employee_name not in file_data['employees']:
-                            file_data['employees'][employee_name] = {
-                                'total_points': 0,
-                                'records': 0
-                            }
-                        
-                        file_data['employees'][employee_name]['total_points'] += points
-                        file_data['employees'][employee_name]['records'] += 1
-                        
-                        # Adicionar ao mês
-                        if month_key not in file_data['months']:
-                            file_data['months'][month_key] = {
-                                'total_points': 0,
-                                'records': 0
-                            }
-                        
-                        file_data['months'][month_key]['total_points'] += points
-                        file_data['months'][month_key]['records'] += 1
-                        
-                        # Adicionar registro
-                        record = {
-                            'employee': employee_name,
-                            'date': str(date_value) if pd.notna(date_value) else 'Sem Data',
-                            'points': points,
-                            'month': month_key
-                        }
-                        file_data['records'].append(record)
-                
-            except Exception as e:
-                logger.error(f"Erro ao processar linha {index}: {str(e)}")
-                continue
+                # Data como veio na planilha
+                raw_dates = frame['raw_date']
+                dates = raw_dates.astype(str).where(raw_dates.notna(), NO_DATE)
+                file_data['records'] = [
+                    {
+                        'employee': employee_name,
+                        'date': date,
+                        'points': points,
+                        'month': month_key
+                    }
+                    for date, points, month_key in zip(
+                        dates.tolist(), frame['points'].tolist(), frame['month'].tolist()
+                    )
+                ]
         
         return {
             'status': 'success',